@@ -0,0 +1,243 @@
+"""Pure pandas/numpy transforms used by the dashboard."""
+import threading
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+
+def downsample_minmax(df, max_points, x='ts', y='upnl', by=None):
+    """Cap every series at about ``max_points`` rows using min/max bucketing.
+
+    Rows of each series (grouped by ``by``, ordered by ``x``) are split into
+    ``max_points // 2`` equal-count buckets; each bucket keeps its min and max
+    ``y`` row, so peaks and troughs (drawdowns) survive. The first and last
+    point of every series are always kept. Series that already fit are
+    returned untouched. Vectorized across all groups at once.
+    """
+    if df.empty or not max_points or y not in df.columns:
+        return df
+
+    keys = [by] if by else []
+    df = df.dropna(subset=[y]).sort_values(keys + [x], kind='stable').reset_index(drop=True)
+    if by:
+        grouped = df.groupby(by, sort=False, observed=True)
+        pos = grouped.cumcount().to_numpy()
+        size = grouped[x].transform('size').to_numpy()
+        group_key = df[by]
+    else:
+        pos = np.arange(len(df))
+        size = np.full(len(df), len(df))
+        group_key = pd.Series(0, index=df.index)
+
+    n_buckets = max(max_points // 2, 1)
+    bucket = pos * n_buckets // size
+
+    by_bucket = df[y].groupby([group_key, bucket], sort=False, observed=True)
+    keep = np.zeros(len(df), dtype=bool)
+    keep[by_bucket.idxmin().to_numpy()] = True
+    keep[by_bucket.idxmax().to_numpy()] = True
+    keep |= (pos == 0) | (pos == size - 1)
+    # Small series are kept whole
+    keep |= size <= max_points
+
+    return df[keep]
+
+
+def filter_keys(df, keys, by='symbol'):
+    """Rows of ``df`` whose ``by`` is one of ``keys``; all rows when ``keys`` is None."""
+    if keys is None or df.empty:
+        return df
+    return df[df[by].isin(keys)]
+
+
+def rank_keys(df, n, y='upnl', by='symbol', largest=True):
+    """The ``n`` keys with the largest (or smallest) total ``y``, in that order."""
+    if df.empty:
+        return ()
+    totals = df.groupby(by, observed=True, sort=False)[y].sum()
+    picked = totals.nlargest(n) if largest else totals.nsmallest(n)
+    return tuple(str(key) for key in picked.index)
+
+
+# Look-back windows for uPNL changes (label -> seconds)
+CHANGE_WINDOWS = {'5m': 300, '15m': 900, '1h': 3600, '4h': 14400, '24h': 86400}
+
+
+def window_changes(df, windows, x='ts', y='upnl', by=None):
+    """Change of ``y`` over every ``{label: seconds}`` window, for all series in one pass.
+
+    For each series (grouped by ``by``) the reference value is the last row at
+    or before ``latest ts - window``, found by binary search (``searchsorted``)
+    on the sorted timestamps. A series that doesn't reach back that far is
+    compared with its first row. Returns one row per series (indexed by
+    ``by``; a single row when ungrouped) with the latest ``y`` and one column
+    per window label.
+    """
+    if df.empty:
+        return pd.DataFrame(columns=[y, *windows], dtype='float64')
+
+    keys = [by] if by else []
+    df = df.sort_values(keys + [x], kind='stable')
+    ts = df[x].to_numpy(dtype='int64')
+    values = df[y].to_numpy(dtype='float64')
+
+    if by:
+        # Rows are sorted by group, so codes in order of appearance are monotonic
+        codes, labels = pd.factorize(df[by], sort=False)
+        index = pd.Index(labels, name=by)
+    else:
+        codes = np.zeros(len(df), dtype='int64')
+        index = pd.RangeIndex(1)
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    ends = np.r_[starts[1:], len(codes)] - 1
+
+    # One sorted key over all series: group offset + timestamp
+    ts_min = ts.min()
+    span = ts.max() - ts_min + 1
+    key = codes.astype('int64') * span + (ts - ts_min)
+    group_offset = np.arange(len(starts), dtype='int64') * span
+
+    latest_ts = ts[ends]
+    latest = values[ends]
+    out = {y: latest}
+    for label, seconds in windows.items():
+        target = group_offset + (latest_ts - seconds - ts_min)
+        pos = np.maximum(np.searchsorted(key, target, side='right') - 1, starts)
+        out[label] = latest - values[pos]
+    return pd.DataFrame(out, index=index)
+
+
+def merge_series(frames, x='ts', y='upnl', by=None):
+    """Sum the series of several sources (e.g. bots) on the union of their timestamps.
+
+    Each source contributes its latest ``y`` at or before every timestamp
+    (as-of, so sources sampled at different times still line up) and
+    nothing before its first row. With ``by``, a key a source doesn't
+    report at one of its own timestamps counts as 0 from then on (closed),
+    and (x, key) pairs no source reports are dropped. One vectorized pivot
+    and reindex per source; returns rows sorted by ``x`` (and ``by``).
+    """
+    frames = [df for df in frames if not df.empty]
+    if not frames:
+        return pd.DataFrame(columns=[x, *([by] if by else []), y])
+    grid = np.unique(np.concatenate([df[x].to_numpy() for df in frames]))
+
+    total = active = None
+    for df in frames:
+        if by:
+            wide = df.pivot_table(index=x, columns=by, values=y, aggfunc='last', observed=True)
+        else:
+            wide = df.drop_duplicates(x, keep='last').set_index(x)[[y]]
+        seen = wide.notna().reindex(grid, method='ffill').fillna(False).astype(bool)
+        wide = wide.fillna(0.0).reindex(grid, method='ffill')
+        if total is None:
+            total, active = wide, seen
+        else:
+            total = total.add(wide, fill_value=0.0)
+            active = active.reindex(columns=total.columns, fill_value=False) | seen.reindex(
+                columns=total.columns, fill_value=False
+            )
+
+    total = total.where(active)
+    total.index.name = x
+    if not by:
+        return total.dropna().reset_index()
+    total.columns = total.columns.astype(str)
+    total.columns.name = by
+    out = total.stack().rename(y).dropna().reset_index()
+    return out.sort_values([x, by], kind='stable').reset_index(drop=True)
+
+
+class IncomeStats:
+    """Running statistics of a daily income series, updated as new days arrive.
+
+    Finished days are folded in once each: cumulative PnL, its peak and max
+    drawdown, best/worst day, winning days and the last ``max(ROLLING)``
+    incomes for rolling sums. The latest day is still moving (today's
+    income changes until the day closes), so it is applied on top of the
+    folded state when results are read. If an already folded day changes
+    (the API revised history), everything is rebuilt from the new series.
+    Thread-safe; ``update`` with the same series twice is a no-op.
+    """
+
+    ROLLING = (7, 30)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.days = 0
+        # Dates and incomes folded so far, to notice any revision of them
+        self.folded_dates = np.array([])
+        self.folded_incomes = np.array([])
+        self.cumulative = 0.0
+        self.peak = 0.0
+        self.max_drawdown = 0.0
+        self.best = None
+        self.worst = None
+        self.wins = 0
+        self.recent = deque(maxlen=max(self.ROLLING))
+        self.pending = None
+
+    def _fold(self, date, income):
+        self.days += 1
+        self.cumulative += income
+        self.peak = max(self.peak, self.cumulative)
+        self.max_drawdown = max(self.max_drawdown, self.peak - self.cumulative)
+        if self.best is None or income > self.best[1]:
+            self.best = (date, income)
+        if self.worst is None or income < self.worst[1]:
+            self.worst = (date, income)
+        self.wins += income > 0
+        self.recent.append(income)
+
+    def update(self, df, x='date', y='income'):
+        """Fold in the days of ``df`` (sorted by ``x``) not seen yet; returns the statistics as a dict.
+
+        Keys: days, total, max_drawdown, best_day / worst_day (date, income),
+        win_rate and one ``pnl_<n>d`` per ``ROLLING`` window.
+        """
+        dates = df[x].to_numpy()
+        incomes = df[y].to_numpy(dtype='float64')
+        with self._lock:
+            folded = self.days
+            if folded and (
+                len(dates) <= folded
+                or not np.array_equal(dates[:folded], self.folded_dates)
+                or not np.array_equal(incomes[:folded], self.folded_incomes)
+            ):
+                self._reset()
+                folded = 0
+            for date, income in zip(dates[folded:-1], incomes[folded:-1]):
+                self._fold(date, income)
+            if self.days != folded:
+                self.folded_dates, self.folded_incomes = dates[:self.days].copy(), incomes[:self.days].copy()
+            self.pending = (dates[-1], incomes[-1]) if len(dates) else None
+            return self._result()
+
+    def _result(self):
+        days, cumulative, peak, max_drawdown = self.days, self.cumulative, self.peak, self.max_drawdown
+        best, worst, wins, recent = self.best, self.worst, self.wins, list(self.recent)
+        if self.pending is not None:
+            date, income = self.pending
+            days += 1
+            cumulative += income
+            peak = max(peak, cumulative)
+            max_drawdown = max(max_drawdown, peak - cumulative)
+            best = (date, income) if best is None or income > best[1] else best
+            worst = (date, income) if worst is None or income < worst[1] else worst
+            wins += income > 0
+            recent.append(income)
+        out = {
+            'days': days,
+            'total': cumulative,
+            'max_drawdown': max_drawdown,
+            'best_day': best,
+            'worst_day': worst,
+            'win_rate': wins / days if days else None,
+        }
+        for n in self.ROLLING:
+            out[f'pnl_{n}d'] = float(sum(recent[-n:]))
+        return out
@@ -3,11 +3,26 @@ import pandas as pd
 import numpy as np
 import requests
 import os
-import altair as alt
+import json
 import time
+import functools
+from dataclasses import replace
+import logging
+import altair as alt
+
+from analytics import CHANGE_WINDOWS, IncomeStats, downsample_minmax, filter_keys, merge_series, rank_keys
+from datafeed import (
+    COMPACT_DTYPES, ENDPOINTS, NORMALIZERS, UNCHANGED, CircuitBreaker, CircuitOpenError, ConditionalGet, MemoryBudget,
+    Poller, PositionStream, RollingBuffer, Snapshot, YearlyIncome, fetch_incremental, fetch_ytd, get_json,
+    make_session, run_parallel, with_datetime,
+)
+from metrics import METRICS
+from report import compute_report, report_html, report_message
+from store import PnlStore
 
 # 1. ตั้งค่าหน้าเว็บให้ดูบนมือถือสวยๆ
 st.set_page_config(page_title="Crypto Bot Dashboard", layout="wide")
+rerun_started = time.perf_counter()
 
 # 2. หัวข้อ
 st.title("📈 Crypto Signal Dashboard")
@@ -27,458 +42,917 @@ try:
 except (FileNotFoundError, KeyError):
     API_ACCESS_KEY = os.environ.get("API_ACCESS_KEY", "mysecretkey")
 
-def get_headers():
-    return {"X-API-Key": API_ACCESS_KEY}
-
-# 3. ดึงข้อมูลจาก API
-@st.cache_data(ttl=60)
-def fetch_data():
-    headers = get_headers()
-    # 1. Fetch Symbol History
-    history_url = f"{API_BASE_URL}/pnl/history"
-    history_data = []
-    try:
-        response = requests.get(history_url, headers=headers, timeout=5)
-        response.raise_for_status()
-        history_data = response.json()
-    except requests.exceptions.RequestException as e:
-        st.error(f"Error fetching data from {history_url}: {e}")
-
-    # 2. Fetch Global History
-    global_url = f"{API_BASE_URL}/pnl/global-history"
-    global_data = []
+def get_setting(name, default):
     try:
-        response = requests.get(global_url, headers=headers, timeout=5)
-        response.raise_for_status()
-        global_data = response.json()
-    except requests.exceptions.RequestException as e:
-        st.error(f"Error fetching data from {global_url}: {e}")
-
-    return history_data, global_data
-
-# Function to fetch YTD data (separate cache to allow year change)
-@st.cache_data(ttl=300)
-def fetch_ytd_data(year):
-    ytd_url = f"{API_BASE_URL}/pnl/ytd-history?year={year}"
+        return st.secrets[name]
+    except (FileNotFoundError, KeyError):
+        return os.environ.get(name, default)
+
+# Configuration: ระยะเวลาที่เก็บ history ไว้ใน rolling buffer (ชั่วโมง)
+PNL_BUFFER_HOURS = float(get_setting("PNL_BUFFER_HOURS", "24"))
+
+# Configuration: retention — raw points for the last PNL_RAW_HOURS, one point per
+# PNL_ROLLUP_SECONDS beyond that; PNL_MEMORY_MB caps the rolling buffers of the process.
+# Longer History Ranges read from the store are not counted against it: they are capped by
+# resolution instead, at most PNL_RANGE_POINTS rolled-up points per series (plus the raw hours)
+PNL_RAW_HOURS = float(get_setting("PNL_RAW_HOURS", "6"))
+PNL_ROLLUP_SECONDS = int(get_setting("PNL_ROLLUP_SECONDS", "300"))
+PNL_MEMORY_MB = float(get_setting("PNL_MEMORY_MB", "512"))
+PNL_RANGE_POINTS = int(get_setting("PNL_RANGE_POINTS", "4000"))
+
+# Configuration: SQLite file that keeps every fetched snapshot ("" = disabled)
+PNL_STORE_PATH = get_setting("PNL_STORE_PATH", "pnl_store.sqlite3")
+
+# Configuration: HTTP connection pool and per-endpoint timeouts (seconds)
+API_POOL_SIZE = int(get_setting("API_POOL_SIZE", "10"))
+API_TIMEOUT = float(get_setting("API_TIMEOUT", "5"))
+API_TIMEOUTS = {
+    name: float(get_setting(f"API_TIMEOUT_{name.upper()}", API_TIMEOUT))
+    for name in ("history", "global", "ytd", "positions")
+}
+
+# Configuration: SSE endpoint that pushes position diffs ("" = poll /position/open only)
+POSITION_STREAM_PATH = get_setting("POSITION_STREAM_PATH", "")
+# How often the positions panels look at the pushed book (cheap: rebuilt only on change)
+POSITION_STREAM_UI_SECONDS = 2
+
+# Configuration: metrics export (port for a Prometheus /metrics endpoint, "" = off; METRICS_LOG=1 logs one JSON line per rerun)
+METRICS_PORT = get_setting("METRICS_PORT", "")
+METRICS_LOG = get_setting("METRICS_LOG", "") not in ("", "0", "false")
+
+# Configuration: bot instances to aggregate, each with its own URL and key. st.secrets
+# [[bots]] tables or API_BOTS='[{"name": "a", "url": "...", "key": "..."}]'; defaults to
+# the single API_BASE_URL / API_ACCESS_KEY bot
+def load_bots():
     try:
-        response = requests.get(ytd_url, headers=get_headers(), timeout=5)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException:
-        # Don't show error immediately to avoid clutter if year is not found
-        return []
+        bots = [dict(bot) for bot in st.secrets["bots"]]
+    except (FileNotFoundError, KeyError):
+        bots = json.loads(os.environ.get("API_BOTS", "[]"))
+    if not bots:
+        bots = [{"name": "main", "url": API_BASE_URL, "key": API_ACCESS_KEY}]
+    return {
+        bot.get("name") or f"bot{i + 1}": {"url": bot["url"].rstrip("/"), "key": bot.get("key", API_ACCESS_KEY)}
+        for i, bot in enumerate(bots)
+    }
+
+BOTS = load_bots()
+
+def get_headers(bot):
+    return {"X-API-Key": BOTS[bot]["key"]}
+
+def bot_url(bot, path):
+    return f"{BOTS[bot]['url']}{path}"
+
+# One keep-alive session per bot for the whole process (reuses TCP/TLS connections)
+@st.cache_resource
+def get_http_session(bot):
+    return make_session(API_POOL_SIZE, headers=get_headers(bot))
+
+# One SQLite file per bot once there are several
+def store_path(bot):
+    if len(BOTS) == 1:
+        return PNL_STORE_PATH
+    root, ext = os.path.splitext(PNL_STORE_PATH)
+    return f"{root}.{bot}{ext}"
+
+@st.cache_resource
+def get_pnl_store(bot):
+    return PnlStore(store_path(bot)) if PNL_STORE_PATH else None
+
+# Prometheus-style /metrics endpoint and the per-rerun log, both process-wide
+@st.cache_resource
+def start_metrics_exporter(port):
+    return METRICS.serve(port=port)
+
+@st.cache_resource
+def get_metrics_logger():
+    logger = logging.getLogger("dashboard.metrics")
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    return logger
+
+if METRICS_PORT:
+    start_metrics_exporter(int(METRICS_PORT))
+
+# Stored rows since `since`: raw for the last PNL_RAW_HOURS, rolled up (by SQLite) to one row per `every` seconds before
+def load_retained(store, name, since, every=PNL_ROLLUP_SECONDS):
+    raw_since = int(time.time() - PNL_RAW_HOURS * 3600)
+    if since >= raw_since:
+        return store.load(name, since=since)
+    return pd.concat([
+        store.load(name, since=since, until=raw_since - 1, every=every),
+        store.load(name, since=raw_since),
+    ], ignore_index=True)
+
+@st.cache_resource
+def get_memory_budget():
+    return MemoryBudget(int(PNL_MEMORY_MB * 2**20))
+
+# Rolling buffers shared by every session; each refresh only parses and appends the new rows
+@st.cache_resource
+def get_pnl_buffers(bot):
+    window = int(PNL_BUFFER_HOURS * 3600)
+    buffers = {
+        name: RollingBuffer(
+            key, window, normalize=functools.partial(normalize, name), raw_seconds=int(PNL_RAW_HOURS * 3600),
+            rollup_seconds=PNL_ROLLUP_SECONDS, budget=get_memory_budget(), dtypes=COMPACT_DTYPES,
+        )
+        for name, key in (("history", ["ts", "symbol"]), ("global", ["ts"]))
+    }
+    # Cold start: reload the window from disk so the first fetch is a delta
+    store = get_pnl_store(bot)
+    if store is not None:
+        for name, buffer in buffers.items():
+            buffer.append(load_retained(store, name, time.time() - window))
+    return buffers
+
+# Configuration: first year of the daily income series (every year since is fetched once, the current one polled)
+YTD_FIRST_YEAR = int(get_setting("YTD_FIRST_YEAR", "2023"))
+
+# Configuration: default watchlist (comma-separated symbols). With API_SYMBOL_FILTER=1 the bot API
+# (which must support a `symbols=A,B` query parameter) is only asked for the watchlist's history
+# and open positions; otherwise every symbol is fetched and the watchlist only scopes the views
+SYMBOL_WATCHLIST = get_setting("SYMBOL_WATCHLIST", "")
+if isinstance(SYMBOL_WATCHLIST, str):
+    SYMBOL_WATCHLIST = [symbol.strip() for symbol in SYMBOL_WATCHLIST.split(",") if symbol.strip()]
+API_SYMBOL_FILTER = get_setting("API_SYMBOL_FILTER", "") not in ("", "0", "false")
+API_SYMBOL_PARAMS = {"symbols": ",".join(SYMBOL_WATCHLIST)} if API_SYMBOL_FILTER and SYMBOL_WATCHLIST else None
+
+# Configuration: circuit breaker per endpoint (consecutive failures before failing fast, max backoff seconds)
+BREAKER_FAILURES = int(get_setting("BREAKER_FAILURES", "3"))
+BREAKER_MAX_BACKOFF = float(get_setting("BREAKER_MAX_BACKOFF", "300"))
+
+# Refresh cadence per data source (seconds): poll interval and panel rerun interval
+REFRESH_SECONDS = {"positions": 15, "history": 60, "ytd": 300}
+
+# How long the very first page load may wait for the poller's first results
+COLD_START_WAIT = max(API_TIMEOUTS.values()) + 1
+
+# 3. ดึงข้อมูลจาก API
+# Fetchers run on the poller's threads, so they must not call st.* themselves.
+# Every bot/endpoint pair is its own poller job, so bots are fetched in parallel.
+# Each job has its own ConditionalGet: unchanged payloads come back as UNCHANGED
+# and the job's snapshot (and everything built from it) is kept as is.
+# Fetch errors propagate: the poller keeps serving the last good snapshot (marked
+# with its age) and keeps revalidating, through the endpoint's circuit breaker.
+
+@st.cache_resource
+def get_breakers():
+    return {
+        (bot, name): CircuitBreaker(BREAKER_FAILURES, base_backoff=API_TIMEOUTS[name], max_backoff=BREAKER_MAX_BACKOFF)
+        for bot in BOTS for name in ENDPOINTS
+    }
+
+def normalize(name, payload):
+    with METRICS.stage(f"parse:{name}"):
+        return NORMALIZERS[name](payload)
+
+def parse(name, payload, bot=None):
+    if payload is UNCHANGED:
+        return payload
+    df = normalize(name, payload)
+    METRICS.set("rows", len(df), dataset=name, bot=bot)
+    return df
+
+def guarded(bot, name, get):
+    # Every request of an endpoint goes through its circuit breaker, is timed and
+    # has its outcome counted (ok / unchanged / error / circuit_open)
+    get = get_breakers()[bot, name].wrap(get)
+    def timed_get(url, **kwargs):
+        with METRICS.stage(f"fetch:{name}"):
+            try:
+                payload = get(url, **kwargs)
+            except CircuitOpenError:
+                METRICS.inc("fetches", endpoint=name, bot=bot, result="circuit_open")
+                raise
+            except requests.exceptions.RequestException:
+                METRICS.inc("fetches", endpoint=name, bot=bot, result="error")
+                raise
+        METRICS.inc("fetches", endpoint=name, bot=bot, result="unchanged" if payload is UNCHANGED else "ok")
+        return payload
+    return timed_get
+
+# Function to fetch YTD data (a year the API doesn't have is empty, not an error)
+def fetch_ytd_data(bot, session, year, get=get_json):
+    return fetch_ytd(bot_url(bot, ENDPOINTS['ytd']), year, session=session, timeout=API_TIMEOUTS["ytd"], get=get)
+
+# Daily income since YTD_FIRST_YEAR: complete years are fetched once (the year that just
+# ended once more after rollover), then only the current year is polled (conditional GET),
+# so changing the year is free
+def poll_income(bot, session, income, get=get_json):
+    current_year = time.localtime().tm_year
+    changed = False
+    for year in range(YTD_FIRST_YEAR, current_year + 1):
+        if income.is_final(year):
+            continue
+        ytd_df = parse("ytd", fetch_ytd_data(bot, session, year, get), bot)
+        if ytd_df is not UNCHANGED:
+            changed |= income.set(year, ytd_df)
+        if year < current_year:
+            income.finalize(year)
+    return income.frame() if changed else UNCHANGED
+
+# Symbol/Global History (delta only: parsed and merged into the rolling buffer, and persisted)
+def poll_series(bot, name, session, buffer, on_append, get):
+    df = fetch_incremental(
+        bot_url(bot, ENDPOINTS[name]), buffer, session=session, timeout=API_TIMEOUTS[name], on_append=on_append, get=get,
+        params=API_SYMBOL_PARAMS if name == "history" else None,
+    )
+    if df is not UNCHANGED:
+        METRICS.set("rows", len(df), dataset=name, bot=bot)
+    return df
 
 # Function to fetch Open Positions (Real-time)
-@st.cache_data(ttl=15) # Cache shorter for real-time positions
-def fetch_open_positions():
-    url = f"{API_BASE_URL}/position/open"
-    headers = get_headers()
-    try:
-        response = requests.get(url, headers=headers, timeout=5)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException:
-        return []
+def fetch_open_positions(bot, session, get=get_json):
+    url = bot_url(bot, ENDPOINTS['positions'])
+    return get(url, session=session, params=API_SYMBOL_PARAMS, timeout=API_TIMEOUTS["positions"])
+
+def poll_positions(bot, session, store, get=get_json, stream=None, logged=None):
+    if stream is not None and stream.connected:
+        # The stream publishes every change itself; polling just logs the book to disk when it moved
+        # (`logged` keeps the book version last written)
+        version = stream.book.version
+        if store is not None and logged.get("version") != version:
+            pos_df = stream.book.frame()
+            if not pos_df.empty:
+                store.append("positions", pos_df.assign(ts=int(time.time())))
+            logged["version"] = version
+        return UNCHANGED
+    pos_df = parse("positions", fetch_open_positions(bot, session, get), bot)
+    if store is not None and pos_df is not UNCHANGED and not pos_df.empty:
+        store.append("positions", pos_df.assign(ts=int(time.time())))
+    return pos_df
+
+def job_name(bot, name):
+    return f"{name}@{bot}"
+
+def start_bot_jobs(poller, bot):
+    session = get_http_session(bot)
+    buffers = get_pnl_buffers(bot)
+    store = get_pnl_store(bot)
+    for name in ("history", "global"):
+        on_append = functools.partial(store.append, name) if store is not None else None
+        get = guarded(bot, name, ConditionalGet().get_json)
+        poller.ensure(
+            job_name(bot, name),
+            functools.partial(poll_series, bot, name, session, buffers[name], on_append, get),
+            REFRESH_SECONDS["history"],
+        )
+    positions_get = ConditionalGet()
+    stream = None
+    if POSITION_STREAM_PATH:
+        # Pushed diffs go into a position book; /position/open polling is the fallback while it's down
+        stream = PositionStream(
+            bot_url(bot, POSITION_STREAM_PATH),
+            on_update=lambda frame: poller.publish(job_name(bot, "positions"), frame),
+            resync=lambda: guarded(bot, "positions", get_json)(
+                bot_url(bot, ENDPOINTS['positions']), session=session, timeout=API_TIMEOUTS["positions"]
+            ),
+            on_disconnect=positions_get.reset,
+            session=session,
+        ).start()
+    get_position_streams()[bot] = stream
+    get = guarded(bot, "positions", positions_get.get_json)
+    poller.ensure(
+        job_name(bot, "positions"),
+        functools.partial(poll_positions, bot, session, store, get, stream, {}),
+        REFRESH_SECONDS["positions"],
+    )
+    income, get_income = YearlyIncome(), guarded(bot, "ytd", ConditionalGet().get_json)
+    poller.ensure(job_name(bot, "ytd"), lambda: poll_income(bot, session, income, get_income), REFRESH_SECONDS["ytd"])
+
+# Position stream of each bot (None without POSITION_STREAM_PATH), for the API status line
+@st.cache_resource
+def get_position_streams():
+    return {}
+
+# One poller for the whole process: API load doesn't grow with the number of viewers
+@st.cache_resource
+def get_poller():
+    poller = Poller()
+    for bot in BOTS:
+        start_bot_jobs(poller, bot)
+    return poller
+
+def read_bot_snapshot(bot, name):
+    return get_poller().get(job_name(bot, name), wait=COLD_START_WAIT)
+
+def snapshot_frame(snapshot, kind):
+    if snapshot is not None and snapshot.data is not None:
+        return snapshot.data
+    # Nothing fetched yet: empty frame with the same schema
+    return NORMALIZERS[kind](None)
+
+# Aggregated views: every bot's series summed on one time axis (positions per symbol/side)
+def merge_positions(frames):
+    df = pd.concat([df.astype({"symbol": str, "side": str}) for df in frames], ignore_index=True)
+    return df.groupby(["symbol", "side"], sort=False)["upnl"].sum().reset_index()
+
+def merge_ytd(frames):
+    income = pd.concat(frames, ignore_index=True).groupby("date", sort=True)["income"].sum()
+    cumulative = merge_series(frames, x="date", y="cumulative_pnl").set_index("date")["cumulative_pnl"]
+    return pd.concat([income, cumulative], axis=1).fillna(0.0).reset_index()
+
+MERGERS = {
+    "history": lambda frames: merge_series(frames, by="symbol"),
+    "global": merge_series,
+    "ytd": merge_ytd,
+    "positions": merge_positions,
+}
+
+def combine(name, frames):
+    frames = [df for df in frames if not df.empty]
+    if len(frames) <= 1:
+        return frames[0] if frames else NORMALIZERS[name](None)
+    return NORMALIZERS[name](MERGERS[name](frames))
+
+# Built reports/charts are shared and reused until one of their snapshots gets a new version
+SNAPSHOT_HASH = {Snapshot: lambda snapshot: (snapshot.version, snapshot.fetched_at)}
+
+@st.cache_resource(max_entries=16, hash_funcs=SNAPSHOT_HASH, show_spinner=False)
+@METRICS.timed("merge")
+def merge_snapshots(name, snapshots):
+    return combine(name, [snapshot_frame(snapshot, name) for snapshot in snapshots])
+
+def merged_snapshot(name, snapshots):
+    live = [s for s in snapshots if s is not None and s.data is not None]
+    errors = [f"{bot}: {s.error}" for bot, s in zip(selected_bots, snapshots) if s is not None and s.error]
+    if not live:
+        return Snapshot(0, None, error="; ".join(errors) or None)
+    # Versions of every bot's snapshot: the merged one changes when any of them does
+    return Snapshot(
+        tuple((s.version, s.fetched_at) if s is not None else None for s in snapshots),
+        merge_snapshots(name, snapshots),
+        fetched_at=max(s.fetched_at or 0 for s in live),
+        error="; ".join(errors) or None,
+        checked_at=min(s.checked_at or s.fetched_at or 0 for s in live),
+    )
+
+@st.cache_resource(max_entries=16, hash_funcs=SNAPSHOT_HASH, show_spinner=False)
+def year_slice(snapshot, year):
+    ytd_df = snapshot.data
+    return ytd_df[ytd_df["date"].dt.year == year].reset_index(drop=True)
+
+# Selected bots' snapshot of `name`, merged when there are several (every year of the income series)
+def read_bots_snapshot(name):
+    snapshots = tuple(read_bot_snapshot(bot, name) for bot in selected_bots)
+    return snapshots[0] if len(snapshots) == 1 else merged_snapshot(name, snapshots)
+
+def read_snapshot(name):
+    snapshot = read_bots_snapshot(name)
+    if name == "ytd" and snapshot is not None and snapshot.data is not None:
+        # The selected year is a slice of the multi-year series
+        snapshot = replace(snapshot, version=(snapshot.version, selected_year), data=year_slice(snapshot, selected_year))
+    return snapshot
+
+def read_frame(name):
+    return snapshot_frame(read_snapshot(name), name)
+
+# Ranges longer than the in-memory buffer come from the on-disk stores (one per bot, read in parallel),
+# rolled up coarser as the range grows so a year is no bigger than PNL_RANGE_POINTS points per series;
+# shared by every session rather than copied into each
+@METRICS.counted("load_stored_range")
+@st.cache_resource(ttl=REFRESH_SECONDS["history"], max_entries=8, show_spinner=False)
+@METRICS.timed("load:stored_range")
+def load_stored_range(name, hours, bots):
+    since = time.time() - hours * 3600
+    every = max(PNL_ROLLUP_SECONDS, -(-int(hours * 3600) // PNL_RANGE_POINTS))
+    frames = run_parallel({
+        bot: lambda bot=bot: NORMALIZERS[name](load_retained(get_pnl_store(bot), name, since, every)).astype(
+            COMPACT_DTYPES
+        )
+        for bot in bots
+    })
+    return combine(name, [frames[bot] for bot in bots])
+
+def history_range(snapshot, name, hours):
+    if hours > PNL_BUFFER_HOURS and PNL_STORE_PATH:
+        return load_stored_range(name, hours, tuple(selected_bots))
+    df = snapshot_frame(snapshot, name)
+    if df.empty:
+        return df
+    return df[df['ts'] >= df['ts'].max() - int(hours * 3600)]
 
 import datetime
 
 # Sidebar Configuration
 st.sidebar.header("Configuration")
+# Several bots: aggregated view by default, or drill down into one of them
+if len(BOTS) > 1:
+    bot_choice = st.sidebar.selectbox("Bot", ["All bots", *BOTS])
+    selected_bots = list(BOTS) if bot_choice == "All bots" else [bot_choice]
+else:
+    selected_bots = list(BOTS)
 current_year = datetime.datetime.now().year
-selected_year = st.sidebar.number_input("Select Year", min_value=2023, max_value=current_year + 1, value=current_year)
+selected_year = st.sidebar.number_input("Select Year", min_value=YTD_FIRST_YEAR, max_value=current_year + 1, value=current_year)
 st.sidebar.divider()
 auto_refresh = st.sidebar.checkbox("Enable Auto Refresh", value=True)
-refresh_interval = st.sidebar.number_input("Refresh Interval (seconds)", min_value=10, value=60)
-
-history_data, global_data = fetch_data()
-ytd_data = fetch_ytd_data(selected_year)
-position_data = fetch_open_positions()
+st.sidebar.caption(
+    ("Positions: live stream" if POSITION_STREAM_PATH else f"Positions every {REFRESH_SECONDS['positions']}s")
+    + f" · History every {REFRESH_SECONDS['history']}s · YTD every {REFRESH_SECONDS['ytd']}s"
+)
+st.sidebar.divider()
+# History charts: min/max bucketing keeps ~2 points per pixel column per series
+downsample_charts = st.sidebar.checkbox("Downsample History Charts", value=True)
+chart_width_px = st.sidebar.number_input(
+    "Chart Width (px)", min_value=200, max_value=4000, value=800, step=100, disabled=not downsample_charts
+)
+max_chart_points = 2 * chart_width_px if downsample_charts else None
+history_hours = st.sidebar.number_input(
+    "History Range (hours)", min_value=1.0, value=PNL_BUFFER_HOURS, step=1.0,
+    max_value=24.0 * 365 if PNL_STORE_PATH else PNL_BUFFER_HOURS,
+)
+# Show the date on the time axis once the range spans more than a day
+time_axis_format = '%d/%m %H:%M' if history_hours > 24 else '%H:%M'
+st.sidebar.divider()
+selected_windows = st.sidebar.multiselect("uPNL Change Windows", list(CHANGE_WINDOWS), default=["15m"])
+change_windows = {label: CHANGE_WINDOWS[label] for label in CHANGE_WINDOWS if label in selected_windows}
+
+# Symbol scope: the report, bars and per-symbol history only process these symbols
+@st.cache_resource(max_entries=16, hash_funcs=SNAPSHOT_HASH, show_spinner=False)
+def known_symbols(history_snap, pos_snap):
+    symbols = set(SYMBOL_WATCHLIST)
+    for df in (snapshot_frame(history_snap, "history"), snapshot_frame(pos_snap, "positions")):
+        symbols.update(str(symbol) for symbol in df["symbol"].unique())
+    return sorted(symbols)
+
+# Top/bottom N by latest uPNL: open positions, or the latest history rows without them
+@st.cache_resource(max_entries=16, hash_funcs=SNAPSHOT_HASH, show_spinner=False)
+def ranked_symbols(history_snap, pos_snap, n, largest):
+    df = snapshot_frame(pos_snap, "positions")
+    if df.empty:
+        history_df = snapshot_frame(history_snap, "history")
+        df = history_df[history_df["ts"] == history_df["ts"].max()]
+    return rank_keys(df, n, largest=largest)
 
-# 4. แสดงผลข้อมูล
-if history_data or global_data or ytd_data or position_data:
-    # 4.0 YTD History (New Section)
-    latest_cum_pnl = 0.0
-    if ytd_data and isinstance(ytd_data, list):
-         ytd_df = pd.DataFrame(ytd_data)
-         if not ytd_df.empty and 'cumulative_pnl' in ytd_df.columns:
-             latest_cum_pnl = ytd_df.iloc[-1]['cumulative_pnl']
-
-    # 4.1 Global Data Processing (Total PNL)
-    current_total_upnl = 0.0
-    report_msg = ""
-    
-    if global_data:
-        global_df = pd.DataFrame(global_data)
-        if 'ts' in global_df.columns:
-            # Convert to Asia/Bangkok Timezone
-            global_df['datetime'] = pd.to_datetime(global_df['ts'], unit='s', utc=True).dt.tz_convert('Asia/Bangkok')
-            
-        if 'upnl' in global_df.columns:
-             # หาค่าล่าสุดสำหรับ Metric
-             if not global_df.empty:
-                # เรียงตามเวลาเพื่อให้แน่ใจว่าได้ตัวล่าสุด
-                global_df = global_df.sort_values('ts')
-                latest_global = global_df.iloc[-1]
-                current_total_upnl = latest_global['upnl']
-                
-                # --- Calculate 15Min Change ---
-                diff = 0.0
-                try:
-                    # หาข้อมูลเมื่อ 15 นาทีที่แล้ว (900 วินาที)
-                    target_ts = latest_global['ts'] - 900
-                    # หา index ของข้อมูลที่ใกล้เคียงที่สุด
-                    idx = (global_df['ts'] - target_ts).abs().idxmin()
-                    past_val = global_df.loc[idx]['upnl']
-                    diff = current_total_upnl - past_val
-                except Exception:
-                    diff = 0.0 # กรณีข้อมูลไม่พอ
-                    
-                # --- Prepare Report Variables ---
-                emoji_total = "🟢" if current_total_upnl >= 0 else "🔴"
-                upnl_sign = "+" if current_total_upnl >= 0 else ""
-                
-                diff_icon = "🟢" if diff >= 0 else "🔴"
-                diff_sign = "+" if diff >= 0 else ""
-                diff_str = f"\n📉 *15Min Change*: {diff_icon} `{diff_sign}{diff:.2f} USD`"
-                
-                realized_pnl = 0.0
-                ytd_pnl = 0.0
-                
-                # Try to get Realized PNL from YTD Data
-                if ytd_data and isinstance(ytd_data, list):
-                     ytd_df_rep = pd.DataFrame(ytd_data)
-                     if not ytd_df_rep.empty:
-                         # Assume last entry is today
-                         last_ytd = ytd_df_rep.iloc[-1]
-                         realized_pnl = last_ytd.get('income', 0.0)
-                         ytd_pnl = last_ytd.get('cumulative_pnl', 0.0)
-
-                realized_icon = "💰" if realized_pnl >= 0 else "💸"
-                realized_sign = "+" if realized_pnl >= 0 else ""
-                
-                ytd_icon = "📈" if ytd_pnl >= 0 else "📉"
-                ytd_sign = "+" if ytd_pnl >= 0 else ""
-
-                # --- Build Message for Copying (Telegram Markdown) ---
-                copy_msg = f"*Total uPNL*: {emoji_total} `{current_total_upnl:+.2f} USD`\n"
-                copy_msg += f"*15m Change*: `{diff:+.2f} USD`\n"
-                copy_msg += f"--------------------------------\n"
-                
-                # Add Symbol Breakdown
-                is_using_live_pos = False
-                positions_to_process = []
-                
-                if position_data and isinstance(position_data, list):
-                     is_using_live_pos = True
-                     positions_to_process = position_data
-                elif history_data:
-                     # Convert history to list of dicts for unified processing
-                     hist_df = pd.DataFrame(history_data)
-                     latest_ts = hist_df['ts'].max()
-                     current_syms = hist_df[hist_df['ts'] == latest_ts].sort_values('upnl', ascending=False)
-                     positions_to_process = current_syms.to_dict('records')
-
-                # --- Build HTML for Display (Colorful UI) ---
-                fallback_warning = ""
-                if not is_using_live_pos:
-                    fallback_warning = '<span style="color:#e67e22; font-size:0.8em; margin-left:10px;">(⚠️ History Data - Live API Failed)</span>'
-
-                # Initialize session state for symbol-wise diff if not present
-                if 'prev_pos_map' not in st.session_state:
-                    st.session_state['prev_pos_map'] = {}
-                
-                current_pos_map = {}
-
-                html_report = f"""
-                <div style="background-color:#1E1E1E; padding:15px; border-radius:10px; border:1px solid #333;">
-                    <h4 style="margin-top:0; color:white;">💰 Total uPNL: <span style="color:{'#2ecc71' if current_total_upnl >= 0 else '#e74c3c'};">{current_total_upnl:+.2f} USD</span>{fallback_warning}</h4>
-                    <p style="color:#aaa; margin-bottom:5px;">📉 15m Change: <span style="color:{'#2ecc71' if diff >= 0 else '#e74c3c'};">{diff:+.2f} USD</span></p>
-                    <p style="color:#aaa; margin-bottom:5px;">💰 Day Realized: <span style="color:{'#2ecc71' if realized_pnl >= 0 else '#e74c3c'};">{realized_pnl:+.2f} USD</span></p>
-                    <p style="color:#aaa; margin-bottom:15px;">📈 YTD Realized: <span style="color:{'#2ecc71' if ytd_pnl >= 0 else '#e74c3c'};">{ytd_pnl:+.2f} USD</span></p>
-                    <hr style="border-top: 1px solid #444;">
-                    <table style="width:100%; color:white; border-collapse: collapse;">
-                        <thead>
-                            <tr style="border-bottom: 1px solid #333;">
-                                <th style="text-align:left; color:#888; padding-bottom:5px; font-size:0.9em;">Symbol</th>
-                                <th style="text-align:left; color:#888; padding-bottom:5px; font-size:0.9em;">Side</th>
-                                <th style="text-align:right; color:#888; padding-bottom:5px; font-size:0.9em;">uPNL</th>
-                                <th style="text-align:right; color:#888; padding-bottom:5px; font-size:0.9em;">Diff</th>
-                            </tr>
-                        </thead>
-                        <tbody>
-                """
-
-                for pos in positions_to_process:
-                    # Generic key access
-                    sym = pos.get('Symbol', pos.get('symbol', 'Unknown'))
-                    upnl = float(pos.get('uPNL', pos.get('upnl', 0.0)))
-                    side = pos.get('Side', pos.get('side', '-'))
-                    if not isinstance(side, str): side = '-'
-                    side = side.upper()
-
-                    # Calculate per-symbol diff
-                    prev_val = st.session_state['prev_pos_map'].get(sym, upnl) # Default to current if new
-                    sym_diff = upnl - prev_val
-                    current_pos_map[sym] = upnl # Store for next run
-
-                    # Colors
-                    side_color = "#2ecc71" if side == "LONG" else "#e74c3c" if side == "SHORT" else "#aaa"
-                    pnl_color = "#2ecc71" if upnl >= 0 else "#e74c3c"
-                    
-                    diff_color = "#aaa"
-                    diff_str = f"{sym_diff:+.2f}"
-                    if sym_diff > 0: diff_color = "#2ecc71"
-                    elif sym_diff < 0: diff_color = "#e74c3c"
-                    
-                    # Add to HTML
-                    html_report += f"<tr><td style='font-weight:bold; color:#3498db; width:20%; font-size:0.8em;'>{sym}</td>"
-                    html_report += f"<td style='font-weight:bold; color:{side_color}; width:20%; font-size:0.8em;'>{side}</td>"
-                    html_report += f"<td style='text-align:right; font-family:monospace; color:{pnl_color}; width:30%; font-size:0.8em;'>{upnl:+.2f} $</td>"
-                    html_report += f"<td style='text-align:right; font-family:monospace; color:{diff_color}; width:30%; font-size:0.8em;'>{diff_str}</td></tr>"
-
-                    
-                    # Add to Copy Msg
-                    icon = "🟢" if upnl >= 0 else "🔴"
-                    copy_msg += f"`{sym:<6} | {side:<5}` {icon} `{upnl:+.2f} $` (`{sym_diff:+.2f}`)\n"
-                
-                # Update session state for next run
-                st.session_state['prev_pos_map'] = current_pos_map
-
-                html_report += "</tbody></table></div>"
-
-                # Show Colorful Report
-                st.markdown(html_report, unsafe_allow_html=True)
-             
-             st.subheader("15m Total Unrealized PNL")
-             # Altair Chart for Global PNL (Locked)
-             chart_global = alt.Chart(global_df).mark_line().encode(
-                 x=alt.X('datetime:T', title='Time', axis=alt.Axis(format='%H:%M')),
-                 y=alt.Y('upnl:Q', title='uPNL (USD)'),
-                 tooltip=[
-                     alt.Tooltip('datetime', title='Time', format='%H:%M:%S'),
-                     alt.Tooltip('upnl', title='uPNL', format=',.2f')
-                 ]
-             )
-             st.altair_chart(chart_global, width="stretch")
-                
-    # --- Inserted Cumulative PNL Chart here ---
-    if ytd_data and isinstance(ytd_data, list):
-            ytd_df = pd.DataFrame(ytd_data)
-            if not ytd_df.empty and 'date' in ytd_df.columns:
-                ytd_df['date'] = pd.to_datetime(ytd_df['date'])
-            
-            st.divider() 
-            # Calculate Latest PNL and Color
-            latest_cum_pnl = ytd_df.iloc[-1]['cumulative_pnl'] if 'cumulative_pnl' in ytd_df.columns else 0.0
-            pnl_color = "#2ecc71" if latest_cum_pnl >= 0 else "#e74c3c"
-            
-            st.markdown(f"### YTD Cumulative PNL\nTotal: <span style='color:{pnl_color}'>{latest_cum_pnl:,.4f} USD</span>", unsafe_allow_html=True)
-            
-            # Altair Chart for Cumulative PNL with Conditional Color (Green > 0, Red < 0)
-            y_min = ytd_df['cumulative_pnl'].min()
-            y_max = ytd_df['cumulative_pnl'].max()
-            
-            # Add padding to domain
-            pad = (y_max - y_min) * 0.1 if y_max != y_min else 1.0
-            domain_min = y_min - pad
-            domain_max = y_max + pad
-            
-            # Default color
-            line_color = "#29b5e8"
-
-            if y_max > 0 and y_min < 0:
-                # Calculate ratio for 0
-                zero_ratio = abs(domain_min) / (domain_max - domain_min)
-                
-                line_color = alt.Gradient(
-                    gradient='linear',
-                    stops=[
-                        alt.GradientStop(color='#e74c3c', offset=0),
-                        alt.GradientStop(color='#e74c3c', offset=zero_ratio),
-                        alt.GradientStop(color='#2ecc71', offset=zero_ratio),
-                        alt.GradientStop(color='#2ecc71', offset=1)
-                    ],
-                    x1=1, x2=1, y1=1, y2=0
-                )
-            elif y_min >= 0:
-                line_color = "#2ecc71" # All Green
-            elif y_max <= 0:
-                line_color = "#e74c3c" # All Red
-
-            chart_cum = alt.Chart(ytd_df).mark_line(color=line_color).encode(
-                x=alt.X('date:T', axis=alt.Axis(format='%d/%m', title='Date', labelAngle=0)),
-                y=alt.Y('cumulative_pnl:Q', title='Cumulative PNL (USD)', scale=alt.Scale(domain=[domain_min, domain_max])),
-                tooltip=[
-                    alt.Tooltip('date', title='Date', format='%d/%m/%Y'),
-                    alt.Tooltip('cumulative_pnl', title='Cum. PNL', format=',.4f')
-                ]
-            )
-            st.altair_chart(chart_cum, width="stretch")
-            st.divider()
-
-    # 4.2 Symbol Data Processing
-    active_symbols_count = 0
-    last_update_str = "-"
-    
-    if history_data:
-        df = pd.DataFrame(history_data)
-        
-        if 'ts' in df.columns:
-            # Convert to Asia/Bangkok Timezone
-            df['datetime'] = pd.to_datetime(df['ts'], unit='s', utc=True).dt.tz_convert('Asia/Bangkok')
-            last_update_str = df['datetime'].max().strftime('%H:%M:%S')
-            
-            # Pivot for chart
-            chart_df = df.pivot(index='datetime', columns='symbol', values='upnl')
-            
-            # Count active symbols (from latest timestamp)
-            latest_ts = df['ts'].max()
-            active_symbols_count = len(df[df['ts'] == latest_ts])
-
-            # Determine sort order based on latest PNL (High to Low)
-            latest_pnl_for_sort = df[df['ts'] == latest_ts].sort_values('upnl', ascending=False)
-            symbol_sort_order = latest_pnl_for_sort['symbol'].tolist()
-
-            # Bar Chart for Latest UPNL
-            st.subheader("Current uPNL by Symbol")
-            
-            # Use Position Data for Bar Chart if available (More accurate)
-            if position_data and isinstance(position_data, list):
-                 pos_df = pd.DataFrame(position_data)
-                 # Normalize column names
-                 if 'uPNL' in pos_df.columns: pos_df['upnl'] = pos_df['uPNL']
-                 if 'Symbol' in pos_df.columns: pos_df['symbol'] = pos_df['Symbol']
-
-                 # Sort for Chart (Max Profit Top)
-                 pos_df = pos_df.sort_values(by='upnl', ascending=False)
-                 symbol_order = pos_df['symbol'].tolist()
-
-                 base = alt.Chart(pos_df).encode(
-                    x=alt.X('upnl:Q', title='uPNL (USD)'),
-                    y=alt.Y('symbol:N', title='', sort=symbol_order),
-                    tooltip=['Symbol', 'uPNL', 'Side']
-                 )
-
-                 bars = base.mark_bar().encode(
-                    color=alt.condition(
-                        alt.datum.upnl >= 0,
-                        alt.value("#2ecc71"),  # Green
-                        alt.value("#e74c3c")   # Red
-                    )
-                 )
-                 
-                 text_pos = base.mark_text(
-                     align='right',
-                     baseline='middle',
-                     dx=-5,
-                     color='white'
-                 ).encode(
-                     text=alt.Text('upnl:Q', format='.2f')
-                 ).transform_filter(
-                     alt.datum.upnl >= 0
-                 )
-
-                 text_neg = base.mark_text(
-                     align='left',
-                     baseline='middle',
-                     dx=5,
-                     color='white'
-                 ).encode(
-                     text=alt.Text('upnl:Q', format='.2f')
-                 ).transform_filter(
-                     alt.datum.upnl < 0
-                 )
-
-                 chart_upnl = bars + text_pos + text_neg
-                 st.altair_chart(chart_upnl, width="stretch")
-                 
-                 with st.expander("Show Raw Position Data"):
-                     st.dataframe(pos_df, width="stretch")
-
-            elif not df.empty:
-                # Altair Bar Chart for Latest UPNL with Custom Labels (Fallback)
-                latest_df = df[df['ts'] == latest_ts].copy()
-                
-                # Sort for Chart
-                latest_df = latest_df.sort_values(by='upnl', ascending=False)
-                symbol_order = latest_df['symbol'].tolist()
-
-                base = alt.Chart(latest_df).encode(
-                    x=alt.X('upnl:Q', title='uPNL (USD)'),
-                    y=alt.Y('symbol:N', title='', sort=symbol_order),
-                    tooltip=['symbol', 'upnl', 'datetime']
-                )
-
-                bars = base.mark_bar().encode(
-                    color=alt.condition(
-                        alt.datum.upnl >= 0,
-                        alt.value("#2ecc71"),  # Green
-                        alt.value("#e74c3c")   # Red
-                    )
-                )
-
-                text_pos = base.mark_text(
-                     align='right',
-                     baseline='middle',
-                     dx=-5,
-                     color='white'
-                ).encode(
-                     text=alt.Text('upnl:Q', format='.2f')
-                ).transform_filter(
-                     alt.datum.upnl >= 0
-                )
-
-                text_neg = base.mark_text(
-                     align='left',
-                     baseline='middle',
-                     dx=5,
-                     color='white'
-                ).encode(
-                     text=alt.Text('upnl:Q', format='.2f')
-                ).transform_filter(
-                     alt.datum.upnl < 0
-                )
-
-                chart_upnl = bars + text_pos + text_neg
-                
-                st.altair_chart(chart_upnl, width="stretch")
-                
-                with st.expander("Show Raw Symbol Data"):
-                    st.dataframe(df.sort_values(by='datetime', ascending=False), width="stretch")
-
-            st.subheader("uPNL History per Symbol")
-            # Altair Chart for Symbol History (Locked)
-            chart_symbols = alt.Chart(df).mark_line().encode(
-                x=alt.X('datetime:T', title='Time', axis=alt.Axis(format='%H:%M')),
-                y=alt.Y('upnl:Q', title='uPNL (USD)'),
-                color=alt.Color('symbol:N', sort=symbol_sort_order, legend=alt.Legend(title=None, orient='bottom', columns=5)),
-                tooltip=[
-                    alt.Tooltip('datetime', title='Time', format='%H:%M:%S'),
-                    'symbol',
-                    alt.Tooltip('upnl', title='uPNL', format=',.2f')
-                ]
-            )
+st.sidebar.divider()
+symbol_scope = st.sidebar.selectbox(
+    "Symbols", ["All", "Top N", "Bottom N", "Watchlist"], index=3 if SYMBOL_WATCHLIST else 0
+)
+watchlist_options, watchlist, top_n = [], (), None
+if symbol_scope == "Watchlist":
+    watchlist_options = known_symbols(read_snapshot("history"), read_snapshot("positions"))
+    watchlist = tuple(st.sidebar.multiselect("Watchlist", watchlist_options, default=SYMBOL_WATCHLIST))
+elif symbol_scope != "All":
+    top_n = st.sidebar.number_input("N (by latest uPNL)", min_value=1, max_value=1000, value=10)
+
+# Resolved by each panel from the current snapshots, so Top/Bottom N follow uPNL between full reruns
+def scope_symbols():
+    if symbol_scope == "Watchlist":
+        if known_symbols(read_snapshot("history"), read_snapshot("positions")) != watchlist_options:
+            # New symbols since the sidebar was drawn: rerun the whole page to offer them
+            st.rerun()
+        return watchlist
+    if top_n is not None:
+        return ranked_symbols(read_snapshot("history"), read_snapshot("positions"), top_n, symbol_scope == "Top N")
+    return None
+
+# Each panel is a fragment that reruns on its own cadence (= TTL of the data it shows)
+def panel_every(name):
+    if not auto_refresh:
+        return None
+    if name == "positions" and POSITION_STREAM_PATH:
+        return POSITION_STREAM_UI_SECONDS
+    return REFRESH_SECONDS[name]
+
+def format_age(seconds):
+    if seconds < 60:
+        return f"{seconds:.0f}s"
+    if seconds < 3600:
+        return f"{seconds // 60:.0f}m"
+    return f"{seconds // 3600:.0f}h {seconds % 3600 // 60:.0f}m"
+
+# Panels keep showing the last good data while an endpoint fails; say how old it is
+def stale_caption(*names):
+    notes = []
+    for bot in selected_bots:
+        for name in names:
+            snapshot = read_bot_snapshot(bot, name)
+            if snapshot is None or not snapshot.error or snapshot.data is None:
+                continue
+            age = format_age(time.time() - (snapshot.checked_at or snapshot.fetched_at))
+            retry_in = get_breakers()[bot, name].retry_in()
+            retry = f", retry in {format_age(retry_in)}" if retry_in else ""
+            label = name if len(BOTS) == 1 else f"{bot} {name}"
+            notes.append(f"{label} data from {age} ago (API unavailable{retry})")
+    if notes:
+        st.caption("⚠️ Showing " + "; ".join(notes))
+
+# 4.1 Global Data Processing (Total PNL) + Report (figures and formatting live in report.py)
+@METRICS.counted("build_report")
+@st.cache_resource(max_entries=16, hash_funcs=SNAPSHOT_HASH, show_spinner=False)
+@METRICS.timed("build:report")
+def build_report(history_snap, global_snap, ytd_snap, pos_snap, change_windows, symbols):
+    report = compute_report(
+        snapshot_frame(history_snap, "history"), snapshot_frame(global_snap, "global"),
+        snapshot_frame(ytd_snap, "ytd"), snapshot_frame(pos_snap, "positions"), change_windows, symbols,
+    )
+    if report is None:
+        return None
+    return report_html(report), report_message(report)
+
+@st.fragment(run_every=panel_every("positions"))
+@METRICS.timed("render:report")
+def render_report():
+    report = build_report(
+        read_snapshot("history"), read_snapshot("global"), read_snapshot("ytd"),
+        read_snapshot("positions"), change_windows, scope_symbols(),
+    )
+    if report is None:
+        return
+    html_report, copy_msg = report
+
+    # Show Colorful Report
+    stale_caption("global", "positions", "ytd")
+    st.markdown(html_report, unsafe_allow_html=True)
+
+# Chart templates: marks and encodings are built once; a refresh only binds its rows as the
+# chart's single top-level dataset, trimmed to the encoded columns
+# Encoded columns only, and only the categories in use (Arrow ships a column's whole dictionary)
+def chart_data(df, columns):
+    df = df[list(dict.fromkeys(columns))]
+    return df.assign(**{
+        col: df[col].cat.remove_unused_categories() for col in df.columns if isinstance(df[col].dtype, pd.CategoricalDtype)
+    })
+
+@functools.lru_cache(maxsize=8)
+def upnl_line_template(time_axis_format, by=None):
+    return alt.Chart().mark_line().encode(
+        x=alt.X('datetime:T', title='Time', axis=alt.Axis(format=time_axis_format)),
+        y=alt.Y('upnl:Q', title='uPNL (USD)'),
+        tooltip=[
+            alt.Tooltip('datetime', title='Time', format='%H:%M:%S'),
+            *([by] if by else []),
+            alt.Tooltip('upnl', title='uPNL', format=',.2f')
+        ]
+    )
+
+@METRICS.counted("build_global_chart")
+@st.cache_resource(max_entries=16, hash_funcs=SNAPSHOT_HASH, show_spinner=False)
+@METRICS.timed("build:global_chart")
+def build_global_chart(global_snap, history_hours, max_chart_points, time_axis_format):
+    global_df = history_range(global_snap, "global", history_hours)
+    if global_df.empty:
+        return None
+
+    global_df = with_datetime(downsample_minmax(global_df, max_chart_points))
+
+    # Altair Chart for Global PNL (Locked)
+    return upnl_line_template(time_axis_format).properties(data=chart_data(global_df, ['datetime', 'upnl']))
+
+@st.fragment(run_every=panel_every("history"))
+@METRICS.timed("render:global_chart")
+def render_global_chart():
+    chart_global = build_global_chart(read_snapshot("global"), history_hours, max_chart_points, time_axis_format)
+    if chart_global is None:
+        return
+
+    st.subheader("15m Total Unrealized PNL")
+    stale_caption("global")
+    with METRICS.stage("chart:global"):
+        st.altair_chart(chart_global, width="stretch")
+
+# --- Cumulative PNL Chart ---
+@METRICS.counted("build_ytd_chart")
+@st.cache_resource(max_entries=16, hash_funcs=SNAPSHOT_HASH, show_spinner=False)
+@METRICS.timed("build:ytd_chart")
+def build_ytd_chart(ytd_snap):
+    ytd_df = snapshot_frame(ytd_snap, "ytd")
+    if ytd_df.empty:
+        return None
+
+    # Calculate Latest PNL
+    latest_cum_pnl = ytd_df.iloc[-1]['cumulative_pnl']
+
+    # Altair Chart for Cumulative PNL with Conditional Color (Green > 0, Red < 0)
+    y_min = ytd_df['cumulative_pnl'].min()
+    y_max = ytd_df['cumulative_pnl'].max()
+
+    # Add padding to domain
+    pad = (y_max - y_min) * 0.1 if y_max != y_min else 1.0
+    domain_min = y_min - pad
+    domain_max = y_max + pad
+
+    # Default color
+    line_color = "#29b5e8"
+
+    if y_max > 0 and y_min < 0:
+        # Calculate ratio for 0
+        zero_ratio = abs(domain_min) / (domain_max - domain_min)
+
+        line_color = alt.Gradient(
+            gradient='linear',
+            stops=[
+                alt.GradientStop(color='#e74c3c', offset=0),
+                alt.GradientStop(color='#e74c3c', offset=zero_ratio),
+                alt.GradientStop(color='#2ecc71', offset=zero_ratio),
+                alt.GradientStop(color='#2ecc71', offset=1)
+            ],
+            x1=1, x2=1, y1=1, y2=0
+        )
+    elif y_min >= 0:
+        line_color = "#2ecc71" # All Green
+    elif y_max <= 0:
+        line_color = "#e74c3c" # All Red
+
+    chart_cum = alt.Chart(ytd_df[['date', 'cumulative_pnl']]).mark_line(color=line_color).encode(
+        x=alt.X('date:T', axis=alt.Axis(format='%d/%m', title='Date', labelAngle=0)),
+        y=alt.Y('cumulative_pnl:Q', title='Cumulative PNL (USD)', scale=alt.Scale(domain=[domain_min, domain_max])),
+        tooltip=[
+            alt.Tooltip('date', title='Date', format='%d/%m/%Y'),
+            alt.Tooltip('cumulative_pnl', title='Cum. PNL', format=',.4f')
+        ]
+    )
+    return latest_cum_pnl, chart_cum
+
+# Statistics are folded in day by day: a poll only adds the new days (and re-applies today)
+@st.cache_resource(max_entries=16, show_spinner=False)
+def get_income_stats(bots, year):
+    return IncomeStats()
+
+def format_day(day):
+    if day is None:
+        return "-"
+    date, income = day
+    return f"{income:+,.2f} ({pd.Timestamp(date):%b %d})"
+
+# Statistics run over every year up to the end of the selected one, so rolling sums and
+# drawdown carry across 1 January; only the chart shows the selected year alone
+def render_income_kpis():
+    income_snap = read_bots_snapshot("ytd")
+    if income_snap is None or income_snap.data is None or income_snap.data.empty:
+        return
+    income_df = income_snap.data[income_snap.data["date"].dt.year <= selected_year]
+    stats = get_income_stats(tuple(selected_bots), selected_year).update(income_df)
+    win_rate = "-" if stats["win_rate"] is None else f"{stats['win_rate']:.0%}"
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Win Rate", win_rate, help=f"Winning days out of {stats['days']}")
+    col2.metric("Max Drawdown", f"{-stats['max_drawdown']:,.2f}")
+    col3.metric("7d PnL", f"{stats['pnl_7d']:+,.2f}")
+    col4.metric("30d PnL", f"{stats['pnl_30d']:+,.2f}")
+    col1, col2 = st.columns(2)
+    col1.metric("Best Day", format_day(stats["best_day"]))
+    col2.metric("Worst Day", format_day(stats["worst_day"]))
+
+@st.fragment(run_every=panel_every("ytd"))
+@METRICS.timed("render:ytd_chart")
+def render_ytd_chart():
+    ytd_snap = read_snapshot("ytd")
+    ytd_chart = build_ytd_chart(ytd_snap)
+    if ytd_chart is None:
+        return
+    latest_cum_pnl, chart_cum = ytd_chart
+
+    st.divider()
+    pnl_color = "#2ecc71" if latest_cum_pnl >= 0 else "#e74c3c"
+    st.markdown(f"### YTD Cumulative PNL\nTotal: <span style='color:{pnl_color}'>{latest_cum_pnl:,.4f} USD</span>", unsafe_allow_html=True)
+    stale_caption("ytd")
+    with METRICS.stage("chart:ytd"):
+        st.altair_chart(chart_cum, width="stretch")
+    st.divider()
+
+@functools.lru_cache(maxsize=4)
+def upnl_bar_template(tooltip):
+    # Bars sorted by uPNL (max profit on top); the three layers share the chart's dataset
+    base = alt.Chart().encode(
+        x=alt.X('upnl:Q', title='uPNL (USD)'),
+        y=alt.Y('symbol:N', title='', sort='-x'),
+        tooltip=list(tooltip)
+    )
+
+    bars = base.mark_bar().encode(
+        color=alt.condition(
+            alt.datum.upnl >= 0,
+            alt.value("#2ecc71"),  # Green
+            alt.value("#e74c3c")   # Red
+        )
+    )
+
+    text_pos = base.mark_text(
+        align='right',
+        baseline='middle',
+        dx=-5,
+        color='white'
+    ).encode(
+        text=alt.Text('upnl:Q', format='.2f')
+    ).transform_filter(
+        alt.datum.upnl >= 0
+    )
+
+    text_neg = base.mark_text(
+        align='left',
+        baseline='middle',
+        dx=5,
+        color='white'
+    ).encode(
+        text=alt.Text('upnl:Q', format='.2f')
+    ).transform_filter(
+        alt.datum.upnl < 0
+    )
+
+    return bars + text_pos + text_neg
+
+def upnl_bar_chart(data, tooltip):
+    return upnl_bar_template(tuple(tooltip)).properties(data=chart_data(data, ['symbol', 'upnl', *tooltip]))
+
+# 4.2 Symbol Data Processing - Bar Chart for Latest UPNL
+@METRICS.counted("build_symbol_bars")
+@st.cache_resource(max_entries=16, hash_funcs=SNAPSHOT_HASH, show_spinner=False)
+@METRICS.timed("build:symbol_bars")
+def build_symbol_bars(history_snap, pos_snap, symbols):
+    history_df = snapshot_frame(history_snap, "history")
+    pos_df = snapshot_frame(pos_snap, "positions")
+    if history_df.empty:
+        return None
+
+    # Use Position Data for Bar Chart if available (More accurate)
+    if not pos_df.empty:
+        # Live positions but none in scope: no chart rather than the history fallback
+        pos_df = filter_keys(pos_df, symbols)
+        if pos_df.empty:
+            return None, "Show Raw Position Data", pos_df
+        # Sort for Chart (Max Profit Top)
+        pos_df = pos_df.sort_values(by='upnl', ascending=False)
+        return upnl_bar_chart(pos_df, ['symbol', 'upnl', 'side']), "Show Raw Position Data", pos_df
+
+    # Altair Bar Chart for Latest UPNL with Custom Labels (Fallback)
+    df = filter_keys(history_df, symbols)
+    latest_df = df[df['ts'] == history_df['ts'].max()]
+
+    # Sort for Chart
+    latest_df = latest_df.sort_values(by='upnl', ascending=False)
+    return (
+        upnl_bar_chart(with_datetime(latest_df), ['symbol', 'upnl', 'datetime']),
+        "Show Raw Symbol Data",
+        with_datetime(df.sort_values(by='ts', ascending=False)),
+    )
+
+@st.fragment(run_every=panel_every("positions"))
+@METRICS.timed("render:symbol_bars")
+def render_symbol_bars():
+    symbol_bars = build_symbol_bars(read_snapshot("history"), read_snapshot("positions"), scope_symbols())
+    if symbol_bars is None:
+        return
+    chart_upnl, raw_label, raw_df = symbol_bars
+
+    st.subheader("Current uPNL by Symbol")
+    stale_caption("positions")
+    if chart_upnl is None:
+        st.info("No open positions in the selected symbols.")
+        return
+    with METRICS.stage("chart:symbol_bars"):
+        st.altair_chart(chart_upnl, width="stretch")
+    with st.expander(raw_label):
+        st.dataframe(raw_df, width="stretch")
+
+# 4.2 Symbol Data Processing - History per Symbol
+@METRICS.counted("build_symbol_history")
+@st.cache_resource(max_entries=16, hash_funcs=SNAPSHOT_HASH, show_spinner=False)
+@METRICS.timed("build:symbol_history")
+def build_symbol_history(history_snap, history_hours, max_chart_points, time_axis_format, symbols):
+    history_df = history_range(history_snap, "history", history_hours)
+    if history_df.empty:
+        return None, "-", 0
+
+    last_update_str = with_datetime(history_df.tail(1))['datetime'].iloc[0].strftime('%H:%M:%S')
+
+    # Count active symbols (from latest timestamp)
+    latest_ts = history_df['ts'].max()
+    active_symbols_count = int((history_df['ts'] == latest_ts).sum())
+
+    # Only the selected symbols are downsampled and drawn
+    df = filter_keys(history_df, symbols)
+    if df.empty:
+        return None, last_update_str, active_symbols_count
+
+    # Determine sort order based on latest PNL (High to Low)
+    latest_pnl_for_sort = df[df['ts'] == latest_ts].sort_values('upnl', ascending=False)
+    symbol_sort_order = latest_pnl_for_sort['symbol'].tolist()
+
+    # Altair Chart for Symbol History (Locked)
+    chart_df = with_datetime(downsample_minmax(df, max_chart_points, by='symbol'))
+    chart_symbols = upnl_line_template(time_axis_format, by='symbol').encode(
+        color=alt.Color('symbol:N', sort=symbol_sort_order, legend=alt.Legend(title=None, orient='bottom', columns=5)),
+    ).properties(data=chart_data(chart_df, ['datetime', 'symbol', 'upnl']))
+    return chart_symbols, last_update_str, active_symbols_count
+
+@st.fragment(run_every=panel_every("history"))
+@METRICS.timed("render:symbol_history")
+def render_symbol_history():
+    chart_symbols, last_update_str, active_symbols_count = build_symbol_history(
+        read_snapshot("history"), history_hours, max_chart_points, time_axis_format, scope_symbols()
+    )
+
+    if chart_symbols is not None:
+        st.subheader("uPNL History per Symbol")
+        stale_caption("history")
+        with METRICS.stage("chart:symbol_history"):
             st.altair_chart(chart_symbols, width="stretch")
 
     # 4.3 KPI Cards
     col1, col2 = st.columns(2)
     col1.metric("Last Update", last_update_str)
     col2.metric("Active Symbols", active_symbols_count)
-
-else:
+    render_income_kpis()
+
+    # 5. แสดงสถานะ connection
+    st.divider()
+    connected = [
+        bot for bot in selected_bots
+        if any(
+            snapshot is not None and snapshot.data is not None and not snapshot.error
+            for snapshot in (read_bot_snapshot(bot, "history"), read_bot_snapshot(bot, "global"))
+        )
+    ]
+    if len(connected) == len(selected_bots):
+        status_text = "🟢 Connected"
+    elif connected:
+        status_text = f"🟠 {len(connected)}/{len(selected_bots)} bots connected"
+    else:
+        status_text = "🔴 Disconnected"
+    streams = [get_position_streams().get(bot) for bot in selected_bots]
+    streams = [stream for stream in streams if stream is not None]
+    if streams:
+        live = sum(stream.connected for stream in streams)
+        if len(streams) == 1:
+            status_text += " · Positions stream: " + ("🟢 Live" if live else "🟠 Polling fallback")
+        else:
+            status_text += f" · Positions streams: {live}/{len(streams)} live"
+    st.caption(f"API Status: {status_text}")
+
+# Sessions only read the poller's latest snapshots; no network I/O on a rerun
+def has_data():
+    return any(not read_frame(name).empty for name in ("history", "global", "ytd", "positions"))
+
+def render_fetch_errors():
+    for bot in selected_bots:
+        for name in ("history", "global"):
+            snapshot = read_bot_snapshot(bot, name)
+            # With data to show, panels mark it as stale instead
+            if snapshot is not None and snapshot.error and snapshot.data is None:
+                st.error(f"Error fetching data from {bot_url(bot, ENDPOINTS[name])}: {snapshot.error}")
+
+# Nothing fetched yet (API down at cold start, or slower than COLD_START_WAIT): keep checking,
+# and switch to the full page once any snapshot has data
+@st.fragment(run_every=panel_every("history"))
+def render_empty_state():
+    if has_data():
+        st.rerun()
+    render_fetch_errors()
     st.info("No data available from API.")
+    # 5. แสดงสถานะ connection
+    st.divider()
+    st.caption("API Status: 🔴 Disconnected")
 
-# 5. แสดงสถานะ connection
-st.divider()
-status_text = "🟢 Connected" if (history_data or global_data) else "🔴 Disconnected"
-st.caption(f"API Status: {status_text}")
+# 4. แสดงผลข้อมูล
+if has_data():
+    render_fetch_errors()
+    render_report()
+    render_global_chart()
+    render_ytd_chart()
+    render_symbol_bars()
+    render_symbol_history()
+else:
+    render_empty_state()
 
 # 6. ปุ่ม Refresh
 if st.button('🔄 Refresh Data'):
-    st.cache_data.clear()
+    get_poller().refresh(wait=COLD_START_WAIT)
     st.rerun()
 
-if auto_refresh:
-    time.sleep(refresh_interval)
-    st.cache_data.clear()
-    st.rerun()
+# 7. Metrics: rerun latency, optional log line and sidebar debug panel
+def render_debug_panel():
+    with st.sidebar.expander("Debug Metrics", expanded=True):
+        stages = pd.DataFrame(
+            [
+                {"stage": name, "count": stats["count"], "p50 ms": stats["p50"] * 1000, "p95 ms": stats["p95"] * 1000}
+                for name, stats in sorted(METRICS.summary().items())
+            ]
+        )
+        st.dataframe(stages, hide_index=True, width="stretch")
+        counters = pd.DataFrame(
+            [
+                {"metric": name, "labels": ", ".join(f"{k}={v}" for k, v in labels), "value": value}
+                for (name, labels), value in sorted(METRICS.counters().items())
+            ]
+        )
+        st.dataframe(counters, hide_index=True, width="stretch")
+        breakers = pd.DataFrame(
+            [
+                {"bot": bot, "endpoint": name, "state": breaker.state, "failures": breaker.failures,
+                 "retry in s": round(breaker.retry_in())}
+                for (bot, name), breaker in sorted(get_breakers().items())
+            ]
+        )
+        st.dataframe(breakers, hide_index=True, width="stretch")
+        st.download_button("Download metrics.prom", METRICS.to_prometheus(), file_name="metrics.prom", mime="text/plain")
+
+rerun_seconds = time.perf_counter() - rerun_started
+METRICS.record("rerun", rerun_seconds)
+if METRICS_LOG:
+    get_metrics_logger().info(METRICS.log_line("rerun", seconds=round(rerun_seconds, 4)))
+if st.sidebar.checkbox("Show Debug Metrics", value=False):
+    render_debug_panel()
@@ -0,0 +1,222 @@
+"""Benchmark the dashboard against the fake bot API at several scales.
+
+    python bench.py                                  # 10/100/500 symbols x 1 day/1 week
+    python bench.py --scales 10x1d 100x6h --repeat 5
+    python bench.py --save-baseline bench_baseline.json
+    python bench.py --baseline bench_baseline.json   # exit status 1 on regressions
+
+Each scale runs in its own process, with a fake API (``fake_api.py``) in
+that process. Two kinds of stage are measured:
+
+- Direct stages, per endpoint: ``fetch`` (HTTP, body bytes), ``decode``
+  (JSON), ``parse`` (``normalize_*``) and ``transform`` (multi-window
+  changes and chart downsampling).
+- App stages, from ``app.py`` under Streamlit's ``AppTest``: a cold
+  rerun, then ``--repeat`` reruns via the Refresh button, each after
+  the bot has moved. Reports every stage the app records in
+  ``metrics.METRICS`` (fetch, parse, build, chart, render, rerun),
+  prefixed ``app:``, and the serialized size of every chart.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SCALES = ["10x1d", "100x1d", "500x1d", "10x1w", "100x1w", "500x1w"]
+DURATIONS = {"h": 60, "d": 24 * 60, "w": 7 * 24 * 60}
+
+# A stage regresses when it is both this much slower (ratio) and this many ms slower than the baseline
+TOLERANCE = 0.25
+MIN_DELTA_MS = 5.0
+
+
+def parse_scale(scale):
+    """``"100x1w"`` -> ``(100, 10080)``: symbols and minutes of history."""
+    symbols, depth = scale.lower().split("x")
+    return int(symbols), int(depth[:-1]) * DURATIONS[depth[-1]]
+
+
+def summarize(samples):
+    """``{stage: [seconds]}`` -> ``{stage: {"p50": ms, "p95": ms, "n": count}}``."""
+    return {
+        name: {
+            "p50": float(np.percentile(values, 50)) * 1000,
+            "p95": float(np.percentile(values, 95)) * 1000,
+            "n": len(values),
+        }
+        for name, values in samples.items() if values
+    }
+
+
+def chart_sizes(at):
+    """Serialized bytes of every chart in an ``AppTest`` run, keyed by mark and y field."""
+    sizes = {}
+    for element in at.get("vega_lite_chart"):
+        spec = json.loads(element.proto.spec)
+        layers = spec.get("layer") or [spec]
+        mark = layers[0].get("mark")
+        mark = mark.get("type") if isinstance(mark, dict) else mark
+        field = layers[0].get("encoding", {}).get("y", {}).get("field", "?")
+        name = f"chart:{mark}:{field}"
+        while name in sizes:
+            name += "'"
+        sizes[name] = element.proto.ByteSize()
+    return sizes
+
+
+def bench_direct(url, repeat, timer, sizes):
+    from analytics import CHANGE_WINDOWS, downsample_minmax, window_changes
+    from datafeed import make_session, normalize_global, normalize_history, normalize_positions, normalize_ytd
+
+    session = make_session()
+    endpoints = {
+        "history": ("/pnl/history", None, normalize_history),
+        "global": ("/pnl/global-history", None, normalize_global),
+        "ytd": ("/pnl/ytd-history", {"year": time.localtime().tm_year}, normalize_ytd),
+        "positions": ("/position/open", None, normalize_positions),
+    }
+    for _ in range(repeat):
+        for name, (path, params, normalize) in endpoints.items():
+            with timer.stage(f"fetch:{name}"):
+                response = session.get(f"{url}{path}", params=params, timeout=600)
+                response.raise_for_status()
+                body = response.content
+            sizes[f"fetch:{name}"] = len(body)
+            with timer.stage(f"decode:{name}"):
+                payload = json.loads(body)
+            with timer.stage(f"parse:{name}"):
+                df = normalize(payload)
+            sizes[f"rows:{name}"] = len(df)
+            if name in ("history", "global"):
+                by = "symbol" if name == "history" else None
+                with timer.stage(f"transform:{name}"):
+                    window_changes(df, CHANGE_WINDOWS, by=by)
+                    downsample_minmax(df, 1600, by=by)
+
+
+def bench_app(bot, repeat, sizes):
+    from streamlit.testing.v1 import AppTest
+
+    from metrics import METRICS
+
+    at = AppTest.from_file(os.path.join(HERE, "app.py"), default_timeout=600)
+    start = time.perf_counter()
+    at.run()
+    METRICS.record("rerun:cold", time.perf_counter() - start)
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    for _ in range(repeat):
+        bot.step()
+        bot.record()
+        start = time.perf_counter()
+        at.button[0].click().run()
+        METRICS.record("rerun:refresh", time.perf_counter() - start)
+    sizes.update(chart_sizes(at))
+    return {f"app:{name}": values for name, values in METRICS.samples().items()}
+
+
+def worker(scale, repeat):
+    """Run one scale in this process; prints its results as one JSON line."""
+    from fake_api import serve
+    from metrics import StageTimer
+
+    symbols, minutes = parse_scale(scale)
+    server, bot = serve(port=0, symbols=symbols, history_minutes=minutes, tick=3600, seed=0)
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    timer, sizes = StageTimer(), {}
+    bench_direct(url, repeat, timer, sizes)
+
+    # The app keeps the whole generated depth in memory; the API calls may take a while at big scales
+    os.environ.update({
+        "API_BASE_URL": url,
+        "PNL_STORE_PATH": "",
+        "PNL_BUFFER_HOURS": str(minutes / 60),
+        "API_TIMEOUT": "600",
+    })
+    samples = timer.samples()
+    samples.update(bench_app(bot, repeat, sizes))
+    print(json.dumps({"scale": scale, "stages": summarize(samples), "sizes": sizes}))
+
+
+def run_scale(scale, repeat):
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--worker", scale, "--repeat", str(repeat)],
+        cwd=HERE, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"{scale} failed:\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def print_result(result):
+    print(f"\n== {result['scale']} ==")
+    print(f"{'stage':<28}{'p50 ms':>10}{'p95 ms':>10}{'n':>5}")
+    for name, stats in sorted(result["stages"].items()):
+        print(f"{name:<28}{stats['p50']:>10.1f}{stats['p95']:>10.1f}{stats['n']:>5}")
+    print(f"{'size':<28}{'bytes/rows':>20}")
+    for name, size in sorted(result["sizes"].items()):
+        print(f"{name:<28}{size:>20,}")
+
+
+def regressions(results, baseline):
+    """Lines describing every stage or size that got worse than ``baseline``."""
+    found = []
+    for scale, result in results.items():
+        base = baseline.get(scale)
+        if base is None:
+            continue
+        for name, stats in result["stages"].items():
+            before = base["stages"].get(name)
+            if before is None:
+                continue
+            after = stats["p50"]
+            if after > before["p50"] * (1 + TOLERANCE) and after - before["p50"] > MIN_DELTA_MS:
+                found.append(f"{scale} {name}: p50 {before['p50']:.1f} -> {after:.1f} ms")
+        for name, size in result["sizes"].items():
+            before = base["sizes"].get(name)
+            if before is not None and size > before * (1 + TOLERANCE):
+                found.append(f"{scale} {name}: {before:,} -> {size:,}")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", nargs="+", default=DEFAULT_SCALES, help="SYMBOLSxDEPTH, depth in h/d/w")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--baseline", help="compare with this baseline file")
+    parser.add_argument("--save-baseline", help="write the results to this baseline file")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.worker, args.repeat)
+        return 0
+
+    results = {}
+    for scale in args.scales:
+        results[scale] = run_scale(scale, args.repeat)
+        print_result(results[scale])
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"\nBaseline saved to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(results, json.load(f))
+        print("\nRegressions:" if found else "\nNo regressions against the baseline.")
+        for line in found:
+            print(f"  {line}")
+        return 1 if found else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
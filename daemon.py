@@ -0,0 +1,95 @@
+"""Headless report and alert runner: polls the bot API, checks threshold rules and posts to a webhook.
+
+    python daemon.py --url http://localhost:8000 --webhook https://hooks.example.com/... \\
+        --total-below -500 --drop 200 --drop-window 15m --symbol-beyond 300 --report-every 3600
+
+Computes the same figures as the dashboard's report (``report.py``)
+without importing Streamlit or Altair, so it starts in about a second and
+keeps only the rolling windows the change figures need. A rule posts once
+when it starts firing (retried each poll until the webhook accepts it), and
+again only after it has cleared. ``--report-every`` also posts the full
+report message on a schedule; without ``--webhook`` messages are only
+logged. Defaults come from the same environment variables as the
+dashboard (``API_BASE_URL``, ``API_ACCESS_KEY``) plus ``ALERT_WEBHOOK_URL``.
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+import requests
+
+from analytics import CHANGE_WINDOWS
+from report import ReportFeed, Rules, evaluate_rules, report_message
+
+log = logging.getLogger("dashboard.daemon")
+
+
+def post(session, webhook, field, text):
+    """Send ``text`` (only log it without ``webhook``); returns whether it was delivered."""
+    if not webhook:
+        log.info("%s", text)
+        return True
+    try:
+        session.post(webhook, json={field: text}, timeout=10).raise_for_status()
+    except requests.exceptions.RequestException as e:
+        log.warning("webhook post failed: %s", e)
+        return False
+    return True
+
+
+def run(feed, rules, webhook=None, field="text", every=60, report_every=None, once=False):
+    """Poll every ``every`` seconds until interrupted (one round with ``once``)."""
+    firing, last_report = set(), None
+    while True:
+        started = time.monotonic()
+        report = feed.refresh()
+        for name, error in feed.errors.items():
+            log.warning("%s: %s", name, error)
+        if report is not None:
+            alerts = evaluate_rules(report, rules)
+            # Rules that cleared can fire again; new alerts count as sent only once delivered
+            firing &= set(alerts)
+            new = {key: message for key, message in alerts.items() if key not in firing}
+            if new and post(feed.session, webhook, field, "\n".join(new.values())):
+                firing |= set(new)
+            if report_every and (last_report is None or started - last_report >= report_every):
+                post(feed.session, webhook, field, report_message(report))
+                last_report = started
+        if once:
+            return report
+        time.sleep(max(every - (time.monotonic() - started), 0))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default=os.environ.get("API_BASE_URL", "http://localhost:8000"))
+    parser.add_argument("--key", default=os.environ.get("API_ACCESS_KEY", "mysecretkey"))
+    parser.add_argument("--webhook", default=os.environ.get("ALERT_WEBHOOK_URL", ""), help="POST messages here")
+    parser.add_argument("--webhook-field", default="text", help='JSON field of the message ("content" for Discord)')
+    parser.add_argument("--every", type=float, default=60, help="seconds between polls")
+    parser.add_argument("--timeout", type=float, default=5, help="API timeout (seconds)")
+    parser.add_argument("--symbols", nargs="+", help="only these symbols (the totals still cover the account)")
+    parser.add_argument("--windows", nargs="+", default=list(CHANGE_WINDOWS), choices=list(CHANGE_WINDOWS))
+    parser.add_argument("--total-below", type=float, help="alert when total uPNL is below this (USD)")
+    parser.add_argument("--drop", type=float, help="alert when total uPNL fell more than this over --drop-window (USD)")
+    parser.add_argument("--drop-window", default="15m", choices=list(CHANGE_WINDOWS))
+    parser.add_argument("--symbol-beyond", type=float, help="alert when one position's |uPNL| exceeds this (USD)")
+    parser.add_argument("--report-every", type=float, help="also post the full report every this many seconds")
+    parser.add_argument("--once", action="store_true", help="poll once, post and exit")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    windows = {label: CHANGE_WINDOWS[label] for label in CHANGE_WINDOWS if label in {*args.windows, args.drop_window}}
+    feed = ReportFeed(args.url, args.key, windows, timeout=args.timeout, symbols=args.symbols)
+    rules = Rules(args.total_below, args.drop, args.drop_window, args.symbol_beyond)
+    try:
+        run(feed, rules, args.webhook, args.webhook_field, args.every, args.report_every, args.once)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
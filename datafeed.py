@@ -0,0 +1,789 @@
+"""Data feed for the dashboard: HTTP fetching, rolling buffers, normalizers, poller and position stream."""
+import functools
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
+from urllib.parse import urlparse
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import METRICS
+
+
+def make_session(pool_size=10, headers=None):
+    """Keep-alive session with a connection pool big enough for parallel fetches."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    if headers:
+        session.headers.update(headers)
+    return session
+
+
+def get_json(url, session=None, headers=None, params=None, timeout=5):
+    """GET ``url`` and decode JSON; raises ``requests.exceptions.RequestException``."""
+    response = (session or requests).get(url, headers=headers, params=params, timeout=timeout)
+    _count_bytes(url, response)
+    response.raise_for_status()
+    return response.json()
+
+
+def _count_bytes(url, response):
+    METRICS.inc("payload_bytes", len(response.content), path=urlparse(url).path)
+
+
+# Returned instead of a payload when the endpoint reports / hashes to the same content
+UNCHANGED = object()
+
+
+class ConditionalGet:
+    """``get_json`` that remembers ETag / Last-Modified and a payload hash per request.
+
+    Sends ``If-None-Match`` / ``If-Modified-Since`` when the server gave
+    validators; a ``304`` or a body whose hash matches the previous one
+    returns ``UNCHANGED`` so callers can skip parsing and everything after it.
+    Requests are told apart by URL and params except ``cursor_params``
+    (e.g. ``since``): when the cursor moved, the request is sent
+    unconditionally and its body is never compared to the previous one.
+    """
+
+    def __init__(self, cursor_params=('since',)):
+        self.cursor_params = frozenset(cursor_params)
+        self._seen = {}
+        self._lock = threading.Lock()
+
+    def get_json(self, url, session=None, headers=None, params=None, timeout=5):
+        params = params or {}
+        key = (url, tuple(sorted((k, v) for k, v in params.items() if k not in self.cursor_params)))
+        cursor = tuple(sorted((k, v) for k, v in params.items() if k in self.cursor_params))
+        with self._lock:
+            seen_cursor, etag, last_modified, digest = self._seen.get(key, (None, None, None, None))
+        if seen_cursor != cursor:
+            # One entry per request kind however far the cursor moves; nothing to validate against yet
+            etag = last_modified = digest = None
+        headers = dict(headers or {})
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+        try:
+            response = (session or requests).get(url, headers=headers, params=params, timeout=timeout)
+            _count_bytes(url, response)
+            if response.status_code == 304 and digest is not None:
+                return UNCHANGED
+            response.raise_for_status()
+        except requests.exceptions.RequestException:
+            # Callers may have published a fallback meanwhile; next fetch is unconditional
+            with self._lock:
+                self._seen.pop(key, None)
+            raise
+
+        new_digest = hashlib.blake2b(response.content, digest_size=16).digest()
+        with self._lock:
+            self._seen[key] = (cursor, response.headers.get("ETag"), response.headers.get("Last-Modified"), new_digest)
+        if new_digest == digest:
+            return UNCHANGED
+        return response.json()
+
+    def reset(self):
+        """Forget every validator so the next request of each kind is unconditional."""
+        with self._lock:
+            self._seen.clear()
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Raised instead of calling an endpoint whose circuit is open."""
+
+
+class CircuitBreaker:
+    """Stops calling a failing endpoint so a dead API doesn't cost a full timeout per poll.
+
+    After ``failure_threshold`` consecutive failures (connection errors,
+    timeouts, 5xx) the circuit opens and calls fail fast with
+    ``CircuitOpenError``. Once the backoff has passed one trial call goes
+    through (half-open): success closes the circuit, failure reopens it
+    with the backoff doubled, from ``base_backoff`` up to ``max_backoff``
+    seconds. 4xx answers mean the endpoint is up and don't count.
+    """
+
+    def __init__(self, failure_threshold=3, base_backoff=5, max_backoff=300):
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.failures = 0
+        self.retry_at = 0.0
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self.failures < self.failure_threshold:
+                return "closed"
+            return "half-open" if self._trial or time.monotonic() >= self.retry_at else "open"
+
+    def retry_in(self):
+        """Seconds until the next trial call (0 unless open)."""
+        with self._lock:
+            if self.failures < self.failure_threshold:
+                return 0.0
+            return max(self.retry_at - time.monotonic(), 0.0)
+
+    def call(self, fn, *args, **kwargs):
+        with self._lock:
+            if self.failures >= self.failure_threshold:
+                if self._trial or time.monotonic() < self.retry_at:
+                    raise CircuitOpenError(
+                        f"circuit open after {self.failures} failures, "
+                        f"retry in {max(self.retry_at - time.monotonic(), 0):.0f}s"
+                    )
+                self._trial = True
+        try:
+            result = fn(*args, **kwargs)
+        except requests.exceptions.RequestException as e:
+            response = getattr(e, "response", None)
+            self._record(ok=response is not None and response.status_code < 500)
+            raise
+        self._record(ok=True)
+        return result
+
+    def wrap(self, get):
+        """``get`` (a ``get_json``-like function) going through this breaker."""
+        return functools.wraps(get)(lambda url, **kwargs: self.call(get, url, **kwargs))
+
+    def _record(self, ok):
+        with self._lock:
+            self._trial = False
+            if ok:
+                self.failures = 0
+                return
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                exponent = min(self.failures - self.failure_threshold, 16)
+                self.retry_at = time.monotonic() + min(self.base_backoff * 2 ** exponent, self.max_backoff)
+
+
+def run_parallel(jobs, max_workers=None):
+    """Run ``{name: callable}`` concurrently and return ``{name: result}``.
+
+    Total time is the slowest job rather than the sum; exceptions propagate.
+    """
+    if not jobs:
+        return {}
+    with ThreadPoolExecutor(max_workers=max_workers or len(jobs)) as pool:
+        futures = {name: pool.submit(fn) for name, fn in jobs.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+
+def _concat(old, new):
+    """``pd.concat`` of two frames that keeps categorical columns categorical (categories unioned)."""
+    if old.empty:
+        return new
+    old, new = old.copy(deep=False), new.copy(deep=False)
+    for col in old.columns:
+        if isinstance(old[col].dtype, pd.CategoricalDtype) and col in new.columns:
+            categories = old[col].cat.categories.union(pd.Index(new[col].astype(object).unique()).dropna())
+            if not categories.equals(old[col].cat.categories):
+                old[col] = old[col].cat.set_categories(categories)
+            new[col] = pd.Categorical(new[col].astype(object), categories=categories)
+    return pd.concat([old, new], ignore_index=True)
+
+
+# In-memory column types of the rolling buffers: uPNL as float32 (cents stay
+# exact below ~100k USD). Only what is held in memory is downcast; deltas are
+# handed on (e.g. persisted) at full precision.
+COMPACT_DTYPES = {'upnl': 'float32'}
+
+
+class RollingBuffer:
+    """In-memory rolling window of rows keyed by ``key_cols`` (always includes ``ts``).
+
+    New rows are appended, deduplicated on the key (latest copy wins) and rows
+    older than ``window_seconds`` behind the newest ``ts`` are dropped.
+
+    ``normalize`` (records -> frame) is applied to each delta only, so the
+    buffer holds typed columns and never re-parses the window; ``dtypes``
+    (e.g. ``COMPACT_DTYPES``) are the column types held in memory.
+    Rows older than ``raw_seconds`` are rolled up to the last row per
+    ``rollup_seconds`` bucket (and key). The frame is replaced, never
+    modified in place, so ``snapshot()`` can share it without copying.
+    A ``MemoryBudget`` caps the bytes held by all the buffers using it.
+    """
+
+    def __init__(self, key_cols, window_seconds, normalize=None, raw_seconds=None, rollup_seconds=300, budget=None,
+                 dtypes=None):
+        self.key_cols = list(key_cols)
+        self.window_seconds = window_seconds
+        self.normalize = normalize or pd.DataFrame
+        self.dtypes = dtypes or {}
+        self.raw_seconds = raw_seconds
+        self.rollup_seconds = rollup_seconds
+        self.frame = pd.DataFrame()
+        self.last_ts = None
+        self.nbytes = 0
+        self.version, self._served = 0, None
+        self._lock = threading.Lock()
+        self.budget = budget
+        if budget is not None:
+            budget.register(self)
+
+    def append(self, records):
+        """Merge ``records`` in and return the rows that were actually new to the buffer (as normalized)."""
+        new = self.normalize(records)
+        if new.empty or 'ts' not in new.columns:
+            return new.iloc[0:0]
+
+        with self._lock:
+            # Client-side trim for APIs that ignore the `since` cursor.
+            # Keep the last seen ts itself: rows for it may have arrived late.
+            dtypes = {col: dtype for col, dtype in self.dtypes.items() if col in new.columns}
+            if self.last_ts is not None:
+                new = new[new['ts'] >= self.last_ts]
+                new = new[~self._held(new.astype(dtypes))]
+            if new.empty:
+                return new
+
+            frame = _concat(self.frame, new.astype(dtypes)).drop_duplicates(subset=self.key_cols, keep='last')
+
+            latest_ts = frame['ts'].max()
+            if self.window_seconds:
+                frame = frame[frame['ts'] >= latest_ts - self.window_seconds]
+
+            frame = self._roll_up(frame.sort_values(self.key_cols, kind='stable'), latest_ts)
+            self._replace(frame.reset_index(drop=True))
+            self.last_ts = latest_ts
+        if self.budget is not None:
+            self.budget.enforce()
+        return new
+
+    def _held(self, rows):
+        """Mask of ``rows`` (in-memory dtypes) already held with the same values, e.g. re-sent rows of the last ts."""
+        tail = self.frame[self.frame['ts'] == self.last_ts] if not self.frame.empty else self.frame
+        if tail.empty or rows.empty:
+            return pd.Series(False, index=rows.index)
+        merged = rows.merge(tail, how='left', on=list(rows.columns), indicator=True)
+        return pd.Series((merged['_merge'] == 'both').to_numpy(), index=rows.index)
+
+    def _roll_up(self, frame, latest_ts):
+        if self.raw_seconds is None or not self.rollup_seconds:
+            return frame
+        ts = frame['ts']
+        old = ts < latest_ts - self.raw_seconds
+        if not old.any():
+            return frame
+        # Rows are sorted by ts, so the last one of each bucket is its newest;
+        # rows rolled up earlier are alone in their bucket and stay as they are
+        keys = [ts[old] // self.rollup_seconds] + [frame.loc[old, c] for c in self.key_cols if c != 'ts']
+        superseded = pd.DataFrame(dict(enumerate(keys))).duplicated(keep='last')
+        return frame.drop(index=superseded.index[superseded.to_numpy()])
+
+    def _replace(self, frame):
+        self.frame = frame
+        self.version += 1
+        self.nbytes = int(frame.memory_usage(index=True, deep=True).sum())
+
+    def shrink(self, fraction):
+        """Drop the oldest whole timestamps until at most ``fraction`` of the rows are left; returns rows dropped."""
+        with self._lock:
+            frame = self.frame
+            keep = int(len(frame) * fraction)
+            if keep >= len(frame):
+                return 0
+            cutoff = frame['ts'].iloc[len(frame) - keep] if keep else frame['ts'].iloc[-1] + 1
+            self._replace(frame[frame['ts'] > cutoff].reset_index(drop=True) if keep else frame.iloc[0:0])
+            return len(frame) - len(self.frame)
+
+    def snapshot(self):
+        with self._lock:
+            self._served = self.version
+            return self.frame
+
+    def modified(self):
+        """Whether the frame changed (appends, rollups, evictions) since the last ``snapshot()``."""
+        with self._lock:
+            return self.version != self._served
+
+
+class MemoryBudget:
+    """Hard ceiling on the bytes held by a set of ``RollingBuffer`` (e.g. all of a process's).
+
+    Checked after every append: when the buffers hold more than ``max_bytes``
+    together, each one drops its oldest rows (rollups first) in proportion,
+    down to ``headroom`` of the ceiling so the next appends don't trim again.
+    """
+
+    def __init__(self, max_bytes, headroom=0.9):
+        self.max_bytes = max_bytes
+        self.headroom = headroom
+        self._buffers = []
+        self._lock = threading.Lock()
+
+    def register(self, buffer):
+        with self._lock:
+            self._buffers.append(buffer)
+
+    def nbytes(self):
+        return sum(buffer.nbytes for buffer in self._buffers)
+
+    def enforce(self):
+        """Shrink the buffers if they are over the ceiling; returns the number of rows dropped."""
+        with self._lock:
+            total, dropped = self.nbytes(), 0
+            if self.max_bytes and total > self.max_bytes:
+                fraction = self.max_bytes * self.headroom / total
+                dropped = sum(buffer.shrink(fraction) for buffer in self._buffers)
+                METRICS.inc('evicted_rows', dropped)
+                total = self.nbytes()
+        METRICS.set('buffer_bytes', total)
+        return dropped
+
+
+class YearlyIncome:
+    """Daily income of several years, one normalized frame per year (thread-safe).
+
+    Lets a poller fetch complete years once and only re-poll the current one:
+    a year is ``final`` once it has been fetched after it ended, so the year
+    that was current at rollover is fetched one last time.
+    """
+
+    def __init__(self):
+        self._years = {}
+        self._final = set()
+        self._lock = threading.Lock()
+
+    def is_final(self, year):
+        with self._lock:
+            return year in self._final
+
+    def finalize(self, year):
+        """Mark ``year`` complete (fetched after it ended): pollers skip it from now on."""
+        with self._lock:
+            self._final.add(year)
+
+    def set(self, year, df):
+        """Store ``year``'s frame; returns whether anything changed."""
+        with self._lock:
+            prev = self._years.get(year)
+            if prev is not None and prev.equals(df):
+                return False
+            self._years[year] = df
+            return True
+
+    def frame(self):
+        """Every year in one frame, sorted by date."""
+        with self._lock:
+            frames = [self._years[year] for year in sorted(self._years) if not self._years[year].empty]
+        if not frames:
+            return normalize_ytd(None)
+        return pd.concat(frames, ignore_index=True)
+
+
+def fetch_incremental(url, buffer, session=None, headers=None, timeout=5, on_append=None, get=get_json, params=None):
+    """Fetch only rows newer than the buffer's cursor and merge them in.
+
+    Sends ``since=<last ts>`` (plus any other ``params``) so the API can
+    filter server-side; the buffer trims client-side as well, so a full
+    response is handled the same way.
+    ``on_append(rows)`` is called with the delta (e.g. to persist it).
+    Returns ``UNCHANGED`` when ``get`` does (e.g. ``ConditionalGet().get_json``
+    on a 304 or an identical payload) or when the buffer is the same as at
+    the previous call, e.g. the API only re-sent the rows of the cursor's ts.
+    Raises ``requests.exceptions.RequestException`` on HTTP errors.
+    """
+    if buffer.last_ts is not None:
+        params = {**(params or {}), "since": int(buffer.last_ts)}
+    payload = get(url, session=session, headers=headers, params=params, timeout=timeout)
+    if payload is UNCHANGED:
+        return UNCHANGED
+    new = buffer.append(payload)
+    if on_append is not None and not new.empty:
+        on_append(new)
+    if not buffer.modified():
+        return UNCHANGED
+    return buffer.snapshot()
+
+
+def fetch_ytd(url, year, session=None, headers=None, timeout=5, get=get_json):
+    """``/pnl/ytd-history`` rows of ``year``; ``[]`` when the API has no such year (404)."""
+    try:
+        return get(url, session=session, headers=headers, params={"year": year}, timeout=timeout)
+    except requests.exceptions.HTTPError as e:
+        if e.response is not None and e.response.status_code == 404:
+            return []
+        raise
+
+
+# --- Payload normalization ---------------------------------------------------
+# Every payload is parsed once, right after it is fetched, into a typed frame
+# with a fixed schema; the UI only ever reads these frames.
+
+TIMEZONE = 'Asia/Bangkok'
+
+# Canonical position columns, whatever casing the bot API uses
+POSITION_COLUMNS = {'Symbol': 'symbol', 'Side': 'side', 'uPNL': 'upnl'}
+
+
+def _frame(payload):
+    if isinstance(payload, pd.DataFrame):
+        return payload.copy()
+    if not isinstance(payload, list):
+        return pd.DataFrame()
+    return pd.DataFrame(payload)
+
+
+def _to_datetime(ts, tz=TIMEZONE):
+    return pd.to_datetime(ts, unit='s', utc=True).dt.tz_convert(tz)
+
+
+def _numeric(df, col, dtype='float64', default=0.0):
+    if col not in df.columns:
+        df[col] = default
+    df[col] = pd.to_numeric(df[col], errors='coerce').fillna(default).astype(dtype)
+
+
+def normalize_global(payload):
+    """``/pnl/global-history`` -> ts:int64, upnl:float64; sorted by ts.
+
+    There is no datetime column: ``with_datetime`` adds one to what gets
+    displayed. Buffers may hold uPNL as float32 (``COMPACT_DTYPES``).
+    """
+    df = _frame(payload)
+    if df.empty or 'ts' not in df.columns:
+        return pd.DataFrame({
+            'ts': pd.Series(dtype='int64'),
+            'upnl': pd.Series(dtype='float64'),
+        })
+    df = df.dropna(subset=['ts'])
+    df['ts'] = df['ts'].astype('int64')
+    _numeric(df, 'upnl')
+    return df[['ts', 'upnl']].sort_values('ts', kind='stable').reset_index(drop=True)
+
+
+def normalize_history(payload):
+    """``/pnl/history`` -> global schema plus symbol:category; sorted by (ts, symbol)."""
+    df = _frame(payload)
+    if df.empty or 'ts' not in df.columns:
+        return normalize_global(None).assign(symbol=pd.Categorical([]))
+    if 'symbol' not in df.columns:
+        df['symbol'] = 'Unknown'
+    df = df.dropna(subset=['ts'])
+    df['ts'] = df['ts'].astype('int64')
+    _numeric(df, 'upnl')
+    df = df[['ts', 'upnl', 'symbol']].astype({'symbol': 'category'})
+    return df.sort_values(['ts', 'symbol'], kind='stable').reset_index(drop=True)
+
+
+def with_datetime(df, tz=TIMEZONE):
+    """``df`` plus a tz-aware ``datetime`` column from ``ts``, for charts and tables."""
+    return df.assign(datetime=_to_datetime(df['ts'], tz))
+
+
+def normalize_ytd(payload):
+    """``/pnl/ytd-history`` -> date:datetime64, income/cumulative_pnl:float64; sorted by date."""
+    df = _frame(payload)
+    if df.empty or 'date' not in df.columns:
+        return pd.DataFrame({
+            'date': pd.Series(dtype='datetime64[ns]'),
+            'income': pd.Series(dtype='float64'),
+            'cumulative_pnl': pd.Series(dtype='float64'),
+        })
+    df['date'] = pd.to_datetime(df['date'])
+    _numeric(df, 'income')
+    _numeric(df, 'cumulative_pnl')
+    return df.sort_values('date', kind='stable').reset_index(drop=True)
+
+
+def normalize_positions(payload):
+    """``/position/open`` -> symbol:category, side:category (LONG/SHORT/-), upnl:float64.
+
+    Keeps the API's row order. Also accepts history rows (no side column).
+    """
+    df = _frame(payload).rename(columns=POSITION_COLUMNS)
+    if df.empty:
+        return pd.DataFrame({
+            'symbol': pd.Categorical([]),
+            'side': pd.Categorical([]),
+            'upnl': pd.Series(dtype='float64'),
+        })
+    if 'symbol' not in df.columns:
+        df['symbol'] = 'Unknown'
+    if 'side' not in df.columns:
+        df['side'] = '-'
+    df['symbol'] = df['symbol'].fillna('Unknown').astype(str).astype('category')
+    side = df['side'].where(df['side'].map(lambda v: isinstance(v, str)), '-')
+    df['side'] = side.str.upper().astype('category')
+    _numeric(df, 'upnl')
+    return df.reset_index(drop=True)
+
+
+# Bot API paths and the normalizer of each one's payload
+ENDPOINTS = {
+    'history': '/pnl/history',
+    'global': '/pnl/global-history',
+    'ytd': '/pnl/ytd-history',
+    'positions': '/position/open',
+}
+
+NORMALIZERS = {
+    'history': normalize_history,
+    'global': normalize_global,
+    'ytd': normalize_ytd,
+    'positions': normalize_positions,
+}
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """Immutable result of one poll. ``version`` only moves when ``data`` changes hands.
+
+    Readers share the same ``data`` object, so they must not mutate it.
+    ``fetched_at`` is when ``data`` was published, ``checked_at`` the last
+    successful poll (an ``UNCHANGED`` poll only moves ``checked_at``).
+    """
+    version: int
+    data: object
+    fetched_at: float = None
+    error: str = None
+    checked_at: float = None
+
+
+class _Job:
+    def __init__(self, name, fn, interval):
+        self.name = name
+        self.fn = fn
+        self.interval = interval
+        self.wake = threading.Event()
+
+
+class Poller:
+    """Process-wide poller: one daemon thread per job, results published as Snapshots.
+
+    However many sessions read a job, its endpoint is hit once per interval.
+    A job whose ``fn`` raises keeps its previous data and records the error.
+    A job returning ``UNCHANGED`` keeps its snapshot (same version), so
+    anything derived from that version can be reused.
+    """
+
+    def __init__(self):
+        self._jobs = {}
+        self._snapshots = {}
+        self._publishes = {}
+        self._cond = threading.Condition()
+
+    def ensure(self, name, fn, interval):
+        """Start polling ``fn`` under ``name`` unless that job is already running."""
+        with self._cond:
+            if name in self._jobs:
+                return
+            job = _Job(name, fn, interval)
+            self._jobs[name] = job
+        threading.Thread(target=self._run, args=(job,), name=f"poller-{name}", daemon=True).start()
+
+    def get(self, name, wait=0):
+        """Latest snapshot for ``name`` (or None). Only blocks before the first publish."""
+        with self._cond:
+            if wait and name not in self._snapshots:
+                self._cond.wait_for(lambda: name in self._snapshots, timeout=wait)
+            return self._snapshots.get(name)
+
+    def refresh(self, names=None, wait=0):
+        """Poll ``names`` (default: all jobs) now, optionally waiting for the results."""
+        with self._cond:
+            jobs = [self._jobs[n] for n in (names or list(self._jobs)) if n in self._jobs]
+            before = {job.name: self._publishes.get(job.name, 0) for job in jobs}
+        for job in jobs:
+            job.wake.set()
+        if wait:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: all(self._publishes.get(n, 0) > count for n, count in before.items()),
+                    timeout=wait,
+                )
+
+    def publish(self, name, data):
+        """Publish ``data`` for ``name`` from outside a polling job (e.g. a push stream)."""
+        self._publish(name, data, None)
+
+    def _run(self, job):
+        while True:
+            try:
+                data, error = job.fn(), None
+            except Exception as e:
+                data, error = None, str(e)
+            self._publish(job.name, data, error)
+
+            job.wake.wait(job.interval)
+            job.wake.clear()
+
+    def _publish(self, name, data, error):
+        with self._cond:
+            prev = self._snapshots.get(name)
+            now = time.time()
+            if error is None and data is UNCHANGED:
+                snapshot = replace(prev, error=None, checked_at=now) if prev else Snapshot(0, None, checked_at=now)
+            elif error is None:
+                snapshot = Snapshot((prev.version if prev else 0) + 1, data, now, checked_at=now)
+            elif prev is not None:
+                snapshot = replace(prev, error=error)
+            else:
+                snapshot = Snapshot(0, None, error=error)
+            self._snapshots[name] = snapshot
+            self._publishes[name] = self._publishes.get(name, 0) + 1
+            self._cond.notify_all()
+
+
+# --- Push stream for open positions ------------------------------------------
+
+def iter_sse(response):
+    """Yield ``(event, data)`` from a streaming text/event-stream response.
+
+    ``data`` is JSON-decoded; comment lines (heartbeats) are skipped. Lines
+    are read as chunks arrive (SSE responses are chunked), not in fixed-size
+    blocks that would hold events back.
+    """
+    event, data = 'message', []
+    for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+        if line is None:
+            continue
+        if not line:
+            if data:
+                yield event, json.loads('\n'.join(data))
+            event, data = 'message', []
+        elif line.startswith(':'):
+            continue
+        else:
+            field, _, value = line.partition(':')
+            value = value[1:] if value.startswith(' ') else value
+            if field == 'event':
+                event = value
+            elif field == 'data':
+                data.append(value)
+
+
+def _position_key(position):
+    side = position.get('side')
+    return str(position.get('symbol', 'Unknown')), side.upper() if isinstance(side, str) else '-'
+
+
+class PositionBook:
+    """Open positions keyed by (symbol, side), kept current by applying stream diffs.
+
+    Events: ``snapshot`` (list, replaces the book), ``position`` (one row,
+    upsert) and ``close`` (``{"symbol", "side"?}``; no side closes every side).
+    ``version`` moves only when a row actually changed.
+    """
+
+    def __init__(self):
+        self._rows = {}
+        self.version = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _canonical(position):
+        return {POSITION_COLUMNS.get(k, k): v for k, v in position.items()}
+
+    def reset(self, positions):
+        rows = {}
+        for position in positions or []:
+            position = self._canonical(position)
+            rows[_position_key(position)] = position
+        with self._lock:
+            changed = {k for k in rows.keys() | self._rows.keys() if rows.get(k) != self._rows.get(k)}
+            self._rows = rows
+            return self._bump(changed)
+
+    def apply(self, event, data):
+        """Apply one stream event; returns True if the book changed."""
+        if event == 'snapshot':
+            return self.reset(data)
+        if not isinstance(data, dict):
+            return False
+        data = self._canonical(data)
+        with self._lock:
+            if event == 'position':
+                key = _position_key(data)
+                if self._rows.get(key) == data:
+                    return False
+                self._rows[key] = data
+                return self._bump({key})
+            if event == 'close':
+                symbol, side = _position_key(data)
+                keys = {k for k in self._rows if k[0] == symbol and (data.get('side') is None or k[1] == side)}
+                for key in keys:
+                    del self._rows[key]
+                return self._bump(keys)
+        return False
+
+    def _bump(self, changed):
+        if not changed:
+            return False
+        self.version += 1
+        return True
+
+    def frame(self):
+        with self._lock:
+            return normalize_positions(list(self._rows.values()))
+
+
+class PositionStream:
+    """Background SSE client that keeps a PositionBook in sync with the bot.
+
+    On every (re)connect the book is resynced from ``resync()`` (the REST
+    snapshot) and/or a server ``snapshot`` event; ``on_update(frame)`` is
+    called after every change. Drops reconnect with
+    exponential backoff, and ``on_disconnect()`` lets callers fall back to
+    polling while ``connected`` is False.
+    """
+
+    def __init__(self, url, on_update, resync=None, on_disconnect=None, session=None, headers=None,
+                 connect_timeout=5, read_timeout=30, max_backoff=60):
+        self.url = url
+        self.on_update = on_update
+        self.resync = resync
+        self.on_disconnect = on_disconnect
+        self.session = session
+        self.headers = {'Accept': 'text/event-stream', **(headers or {})}
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_backoff = max_backoff
+        self.book = PositionBook()
+        self.connected = False
+        self.last_error = None
+
+    def start(self):
+        threading.Thread(target=self._run, name='position-stream', daemon=True).start()
+        return self
+
+    def _run(self):
+        backoff = 1
+        while True:
+            try:
+                with (self.session or requests).get(
+                    self.url, headers=self.headers, stream=True, timeout=self.timeout
+                ) as response:
+                    response.raise_for_status()
+                    # Resync before applying diffs; diffs sent meanwhile wait in the socket
+                    if self.resync is not None:
+                        self.book.reset(self.resync())
+                    self.connected, self.last_error, backoff = True, None, 1
+                    self.on_update(self.book.frame())
+
+                    for event, data in iter_sse(response):
+                        if self.book.apply(event, data):
+                            self.on_update(self.book.frame())
+                    self.last_error = 'stream closed by server'
+            except (requests.exceptions.RequestException, ValueError) as e:
+                self.last_error = str(e)
+            finally:
+                if self.connected:
+                    self.connected = False
+                    if self.on_disconnect is not None:
+                        self.on_disconnect()
+            time.sleep(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
@@ -0,0 +1,303 @@
+"""Local stand-in for the bot API (stdlib only), for running and benchmarking the dashboard without a bot.
+
+    python fake_api.py --port 8000 --symbols 100 --history-minutes 10080
+    API_BASE_URL=http://localhost:8000 POSITION_STREAM_PATH=/position/stream streamlit run app.py
+
+Serves ``/pnl/history`` and ``/pnl/global-history`` (minute data, ``since``
+supported), ``/pnl/ytd-history?year=``, ``/position/open`` (the history and
+open positions take an optional ``symbols=A,B`` filter) and an SSE
+``/position/stream`` that pushes a ``snapshot`` event on connect, then
+``position`` / ``close`` diffs. Every request can be slowed down
+(``latency`` + random ``jitter`` seconds) or failed with a 500
+(``failure_rate``, or always for the paths in ``fail_paths``); these are
+plain attributes of the bot, so they can be changed while serving.
+"""
+import argparse
+import datetime
+import json
+import random
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Rows per chunk when streaming large JSON arrays
+ROWS_PER_CHUNK = 5000
+
+
+class FakeBot:
+    """Random-walk open positions and uPNL history, plus a log of the diffs pushed to stream clients."""
+
+    def __init__(self, symbols=10, tick=1.0, seed=None, history_minutes=24 * 60, interval=60,
+                 latency=0.0, jitter=0.0, failure_rate=0.0, fail_paths=()):
+        self.rng = random.Random(seed)
+        self.seed = seed
+        self.symbols = [f"SYM{i:03d}USDT" for i in range(symbols)]
+        self.tick = tick
+        self.interval = interval
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.fail_paths = set(fail_paths)
+        self.fault_rng = random.Random(seed)
+
+        # History: one shared timestamp axis, one float array per symbol, totals per ts
+        last_ts = int(time.time()) // interval * interval
+        self.ts = array('q', range(last_ts - (history_minutes - 1) * interval, last_ts + 1, interval))
+        self.history = {}
+        for sym in self.symbols:
+            value, values = 0.0, array('d')
+            for _ in self.ts:
+                value = round(value + self.rng.gauss(0, 1), 4)
+                values.append(value)
+            self.history[sym] = values
+        self.totals = array('d', (round(sum(v), 4) for v in zip(*self.history.values())) if self.history else ())
+
+        self.positions = {
+            sym: {"Symbol": sym, "Side": self.rng.choice(["LONG", "SHORT"]), "uPNL": self.history[sym][-1]}
+            for sym in self.symbols
+        }
+        self.events = []
+        self.stream_generation = 0
+        self.cond = threading.Condition()
+
+    def open_positions(self, symbols=None):
+        with self.cond:
+            return [dict(p) for sym, p in self.positions.items() if symbols is None or sym in symbols]
+
+    def step(self):
+        """Move a few positions, occasionally close or open one, and log the diffs."""
+        with self.cond:
+            for sym in self.rng.sample(self.symbols, k=max(1, len(self.symbols) // 5)):
+                position = self.positions.get(sym)
+                if position is None:
+                    position = {"Symbol": sym, "Side": self.rng.choice(["LONG", "SHORT"]), "uPNL": 0.0}
+                    self.positions[sym] = position
+                elif self.rng.random() < 0.02:
+                    del self.positions[sym]
+                    self.events.append(("close", {"Symbol": sym}))
+                    continue
+                position["uPNL"] = round(position["uPNL"] + self.rng.gauss(0, 1), 4)
+                self.events.append(("position", dict(position)))
+            self.cond.notify_all()
+
+    def record(self, ts=None):
+        """Append one history point per symbol (current uPNL, 0 when closed) at ``ts`` (default: next interval)."""
+        with self.cond:
+            ts = self.ts[-1] + self.interval if ts is None else int(ts)
+            self.ts.append(ts)
+            total = 0.0
+            for sym in self.symbols:
+                position = self.positions.get(sym)
+                value = position["uPNL"] if position is not None else 0.0
+                self.history[sym].append(value)
+                total += value
+            self.totals.append(round(total, 4))
+            return ts
+
+    def _since(self, since):
+        """Index range and a copy of the timestamps for ``ts >= since``."""
+        start = bisect_left(self.ts, since) if since else 0
+        return start, self.ts[start:]
+
+    def history_rows(self, since=None, symbols=None):
+        """``/pnl/history`` rows, pre-encoded, ordered by (ts, symbol)."""
+        with self.cond:
+            start, ts = self._since(since)
+            series = [(sym, self.history[sym][start:]) for sym in self.symbols if symbols is None or sym in symbols]
+        for i, t in enumerate(ts):
+            for sym, values in series:
+                yield f'{{"ts":{t},"symbol":"{sym}","upnl":{values[i]!r}}}'
+
+    def global_rows(self, since=None):
+        """``/pnl/global-history`` rows, pre-encoded, ordered by ts."""
+        with self.cond:
+            start, ts = self._since(since)
+            totals = self.totals[start:]
+        for t, total in zip(ts, totals):
+            yield f'{{"ts":{t},"upnl":{total!r}}}'
+
+    def ytd_rows(self, year):
+        """Daily realized income for ``year`` up to today (nothing for future years)."""
+        today = datetime.date.today()
+        day = datetime.date(year, 1, 1)
+        rng = random.Random(f"{self.seed}-{year}")
+        rows, cumulative = [], 0.0
+        while day <= min(today, datetime.date(year, 12, 31)):
+            income = round(rng.gauss(2, 10), 2)
+            cumulative = round(cumulative + income, 2)
+            rows.append({"date": day.isoformat(), "income": income, "cumulative_pnl": cumulative})
+            day += datetime.timedelta(days=1)
+        return rows
+
+    def inject_fault(self, path):
+        """Sleep for the configured latency; True if this request should fail."""
+        delay = self.latency + (self.fault_rng.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay:
+            time.sleep(delay)
+        return path in self.fail_paths or (self.failure_rate and self.fault_rng.random() < self.failure_rate)
+
+    def drop_streams(self):
+        """Disconnect every stream client (to exercise reconnect + resync)."""
+        with self.cond:
+            self.stream_generation += 1
+            self.cond.notify_all()
+
+    def run(self):
+        while True:
+            time.sleep(self.tick)
+            self.step()
+            if time.time() >= self.ts[-1] + self.interval:
+                self.record()
+
+
+def _query_int(query, name, default=None):
+    try:
+        return int(query[name][0])
+    except (KeyError, IndexError, ValueError):
+        return default
+
+
+def _query_set(query, name):
+    """``name=A,B`` (or repeated ``name=``) as a set; None when absent."""
+    if name not in query:
+        return None
+    return {value for values in query[name] for value in values.split(",") if value}
+
+
+def make_handler(bot):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body go out as separate writes; don't let Nagle + delayed ACK add ~40 ms
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args):
+            pass
+
+        def send_json(self, body, status=200):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def write_chunk(self, text):
+            data = text.encode()
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        def send_rows(self, rows):
+            """Stream pre-encoded JSON objects as one array, chunked so big histories never sit in memory."""
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            batch, sep = [], "["
+            for row in rows:
+                batch.append(row)
+                if len(batch) == ROWS_PER_CHUNK:
+                    self.write_chunk(sep + ",".join(batch))
+                    batch, sep = [], ","
+            if batch:
+                self.write_chunk(sep + ",".join(batch) + "]")
+            else:
+                self.write_chunk("]" if sep == "," else "[]")
+            self.wfile.write(b"0\r\n\r\n")
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            route = ROUTES.get(url.path)
+            if route is None:
+                self.send_json({"detail": "Not Found"}, 404)
+                return
+            if bot.inject_fault(url.path):
+                self.send_json({"detail": "Injected failure"}, 500)
+                return
+            route(self, bot, query)
+
+        def stream_positions(self, bot):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            try:
+                with bot.cond:
+                    cursor, generation = len(bot.events), bot.stream_generation
+                self.write_chunk(f"event: snapshot\ndata: {json.dumps(bot.open_positions())}\n\n")
+                while True:
+                    with bot.cond:
+                        bot.cond.wait_for(
+                            lambda: len(bot.events) > cursor or bot.stream_generation != generation, timeout=10
+                        )
+                        if bot.stream_generation != generation:
+                            break
+                        pending, cursor = bot.events[cursor:], len(bot.events)
+                    # One chunk per batch of events; a comment line as heartbeat when idle
+                    self.write_chunk(
+                        "".join(f"event: {e}\ndata: {json.dumps(d)}\n\n" for e, d in pending) or ": heartbeat\n\n"
+                    )
+                self.wfile.write(b"0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            self.close_connection = True
+
+    return Handler
+
+
+ROUTES = {
+    "/pnl/history": lambda handler, bot, query: handler.send_rows(
+        bot.history_rows(_query_int(query, "since"), _query_set(query, "symbols"))
+    ),
+    "/pnl/global-history": lambda handler, bot, query: handler.send_rows(bot.global_rows(_query_int(query, "since"))),
+    "/pnl/ytd-history": lambda handler, bot, query: handler.send_json(
+        bot.ytd_rows(_query_int(query, "year", datetime.date.today().year))
+    ),
+    "/position/open": lambda handler, bot, query: handler.send_json(bot.open_positions(_query_set(query, "symbols"))),
+    "/position/stream": lambda handler, bot, query: handler.stream_positions(bot),
+}
+
+
+def serve(host="127.0.0.1", port=8000, **bot_options):
+    """Start the fake API on a background thread (``port=0`` picks a free one); returns ``(server, bot)``."""
+    bot = FakeBot(**bot_options)
+    threading.Thread(target=bot.run, daemon=True).start()
+    server = ThreadingHTTPServer((host, port), make_handler(bot))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, bot
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--symbols", type=int, default=10)
+    parser.add_argument("--history-minutes", type=int, default=24 * 60, help="history depth in points")
+    parser.add_argument("--interval", type=int, default=60, help="seconds between history points")
+    parser.add_argument("--tick", type=float, default=1.0, help="seconds between position updates")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random extra latency, up to this many seconds")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fraction of requests answered with a 500")
+    parser.add_argument("--fail-path", action="append", default=[], help="always answer this path with a 500")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+    server, _ = serve(
+        args.host, args.port, symbols=args.symbols, tick=args.tick, seed=args.seed,
+        history_minutes=args.history_minutes, interval=args.interval, latency=args.latency,
+        jitter=args.jitter, failure_rate=args.failure_rate, fail_paths=args.fail_path,
+    )
+    print(f"Fake bot API on http://{args.host}:{server.server_address[1]}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
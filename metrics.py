@@ -0,0 +1,174 @@
+"""Per-stage timings, counters and gauges for the dashboard and bench.py.
+
+Everything lives in one process-wide ``METRICS`` registry shared by all
+sessions and the background poller threads. ``to_prometheus()`` renders
+it in the Prometheus text format, ``serve()`` exposes that on
+``/metrics`` and ``log_line()`` formats one JSON log line per event.
+"""
+import functools
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+PREFIX = 'dashboard'
+QUANTILES = (0.5, 0.95)
+
+
+class StageTimer:
+    """Thread-safe recorder of the last ``maxlen`` durations (seconds) per stage name."""
+
+    def __init__(self, maxlen=1000):
+        self._lock = threading.Lock()
+        self._samples = defaultdict(lambda: deque(maxlen=maxlen))
+        # All-time count and sum per stage (the deque only keeps recent samples)
+        self._totals = defaultdict(lambda: [0, 0.0])
+        self._local = threading.local()
+
+    def record(self, name, seconds):
+        with self._lock:
+            self._samples[name].append(seconds)
+            totals = self._totals[name]
+            totals[0] += 1
+            totals[1] += seconds
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def timed(self, name):
+        """Decorator form of ``stage``."""
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                # Lets ``Metrics.counted`` tell a cache miss (body ran) from a hit
+                self._local.runs = getattr(self._local, 'runs', 0) + 1
+                with self.stage(name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def samples(self):
+        """``{stage: [seconds, ...]}``, oldest first."""
+        with self._lock:
+            return {name: list(values) for name, values in self._samples.items()}
+
+
+def _labels(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (k, v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for k, v in labels
+    )
+    return '{' + ','.join(f'{k}="{v}"' for k, v in escaped) + '}'
+
+
+class Metrics(StageTimer):
+    """``StageTimer`` plus labelled counters and gauges."""
+
+    def __init__(self, maxlen=1000):
+        super().__init__(maxlen)
+        self._counters = defaultdict(float)
+        self._gauges = {}
+
+    def inc(self, name, value=1, **labels):
+        with self._lock:
+            self._counters[name, _labels(labels)] += value
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._gauges[name, _labels(labels)] = value
+
+    def counted(self, cache):
+        """Outer decorator for an ``st.cache_*`` function whose body is ``timed``: counts hits and misses."""
+        def decorator(cached_fn):
+            @functools.wraps(cached_fn)
+            def wrapper(*args, **kwargs):
+                before = getattr(self._local, 'runs', 0)
+                result = cached_fn(*args, **kwargs)
+                miss = getattr(self._local, 'runs', 0) > before
+                self.inc('cache_requests', cache=cache, result='miss' if miss else 'hit')
+                return result
+            return wrapper
+        return decorator
+
+    def summary(self):
+        """``{stage: {"count", "sum", "p50", "p95"}}`` in seconds; quantiles over the recent samples."""
+        with self._lock:
+            recent = {name: np.fromiter(values, dtype='float64') for name, values in self._samples.items()}
+            totals = {name: tuple(values) for name, values in self._totals.items()}
+        out = {}
+        for name, values in recent.items():
+            if not len(values):
+                continue
+            p50, p95 = np.quantile(values, QUANTILES)
+            out[name] = {'count': totals[name][0], 'sum': totals[name][1], 'p50': p50, 'p95': p95}
+        return out
+
+    def counters(self):
+        """``{(name, labels): value}`` for counters and gauges alike."""
+        with self._lock:
+            return {**self._counters, **self._gauges}
+
+    def to_prometheus(self):
+        """Everything in the Prometheus text exposition format."""
+        lines = [f'# TYPE {PREFIX}_stage_seconds summary']
+        for name, stats in sorted(self.summary().items()):
+            for q, key in zip(QUANTILES, ('p50', 'p95')):
+                labels = _format_labels((('stage', name), ('quantile', str(q))))
+                lines.append(f'{PREFIX}_stage_seconds{labels} {stats[key]:.6f}')
+            lines.append(f'{PREFIX}_stage_seconds_sum{_format_labels((("stage", name),))} {stats["sum"]:.6f}')
+            lines.append(f'{PREFIX}_stage_seconds_count{_format_labels((("stage", name),))} {stats["count"]}')
+        with self._lock:
+            counters, gauges = dict(self._counters), dict(self._gauges)
+        for kind, values, suffix in (('counter', counters, '_total'), ('gauge', gauges, '')):
+            for metric in sorted({name for name, _ in values}):
+                lines.append(f'# TYPE {PREFIX}_{metric}{suffix} {kind}')
+                for (name, labels), value in sorted(values.items()):
+                    if name == metric:
+                        lines.append(f'{PREFIX}_{metric}{suffix}{_format_labels(labels)} {value:g}')
+        return '\n'.join(lines) + '\n'
+
+    def log_line(self, event, **fields):
+        """One JSON object per line (``event``, ``ts`` and ``fields``), for log-based p50/p95."""
+        return json.dumps({'event': event, 'ts': round(time.time(), 3), **fields})
+
+    def serve(self, host='0.0.0.0', port=9108):
+        """Serve ``/metrics`` on a daemon thread; returns the server."""
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.to_prometheus().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+# Process-wide registry the dashboard records into
+METRICS = Metrics()
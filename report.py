@@ -0,0 +1,274 @@
+"""PnL report: figures, formatting, alert rules and a fetcher for them.
+
+Shared by the dashboard (``app.py``) and the headless runner
+(``daemon.py``): ``compute_report`` turns the normalized frames into a
+``Report``, ``report_html`` / ``report_message`` format it and
+``evaluate_rules`` checks it against alert thresholds. ``ReportFeed``
+fetches the frames of one bot without the dashboard's poller.
+
+Keep this module and what it imports (``analytics``, ``datafeed``) free
+of Streamlit and Altair imports: the headless runner loads it on its own.
+"""
+import functools
+import time
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+import requests
+
+from analytics import filter_keys, window_changes
+from datafeed import (
+    COMPACT_DTYPES, ENDPOINTS, UNCHANGED, ConditionalGet, RollingBuffer, fetch_incremental, fetch_ytd, make_session,
+    normalize_global, normalize_history, normalize_positions, normalize_ytd, run_parallel,
+)
+
+
+@dataclass(frozen=True)
+class Report:
+    """Figures of one report; ``positions`` has symbol, side, upnl and one change column per window."""
+
+    total: float
+    changes: dict
+    realized: float
+    ytd: float
+    positions: pd.DataFrame
+    live_positions: bool
+
+
+def compute_report(history_df, global_df, ytd_df, pos_df, change_windows, symbols=None):
+    """``Report`` from the normalized frames, or None while there is no global history.
+
+    Without open positions, the latest history rows stand in for them
+    (``live_positions`` is then False). With ``symbols``, only those
+    positions are listed (possibly none, while other symbols have live
+    positions) and only their history is looked at; the totals still cover
+    the whole account.
+    """
+    if global_df.empty:
+        return None
+    live_positions = not pos_df.empty
+    history_df = filter_keys(history_df, symbols)
+    pos_df = filter_keys(pos_df, symbols)
+
+    # uPNL change over each window, for the total and every symbol at once
+    total_changes = window_changes(global_df, change_windows).iloc[0]
+    symbol_changes = window_changes(history_df, change_windows, by='symbol').rename(index=str)
+
+    realized = ytd = 0.0
+    if not ytd_df.empty:
+        # Assume last entry is today
+        last_ytd = ytd_df.iloc[-1]
+        realized, ytd = float(last_ytd['income']), float(last_ytd['cumulative_pnl'])
+
+    positions = pos_df
+    if not live_positions and not history_df.empty:
+        # Same position schema built from the latest history rows
+        latest_ts = history_df['ts'].max()
+        current_syms = history_df[history_df['ts'] == latest_ts].sort_values('upnl', ascending=False)
+        positions = normalize_positions(current_syms[['symbol', 'upnl']])
+
+    # Per-symbol changes from the history series (0 for symbols without history)
+    labels = list(change_windows)
+    position_changes = symbol_changes.reindex(positions['symbol'].astype(str))[labels].fillna(0.0)
+    positions = positions[['symbol', 'side', 'upnl']].reset_index(drop=True).join(
+        position_changes.reset_index(drop=True)
+    )
+    return Report(
+        total=float(total_changes['upnl']),
+        changes={label: float(total_changes[label]) for label in labels},
+        realized=realized,
+        ytd=ytd,
+        positions=positions,
+        live_positions=live_positions,
+    )
+
+
+# One report row; cached so only rows whose values changed are formatted again
+@functools.lru_cache(maxsize=4096)
+def position_row(sym, side, upnl, sym_diffs, labels, change_width):
+    # Colors
+    side_color = "#2ecc71" if side == "LONG" else "#e74c3c" if side == "SHORT" else "#aaa"
+    pnl_color = "#2ecc71" if upnl >= 0 else "#e74c3c"
+
+    # HTML row
+    row_html = f"<tr><td style='font-weight:bold; color:#3498db; width:20%; font-size:0.8em;'>{sym}</td>"
+    row_html += f"<td style='font-weight:bold; color:{side_color}; width:20%; font-size:0.8em;'>{side}</td>"
+    row_html += f"<td style='text-align:right; font-family:monospace; color:{pnl_color}; width:30%; font-size:0.8em;'>{upnl:+.2f} $</td>"
+    for sym_diff in sym_diffs:
+        diff_color = "#2ecc71" if sym_diff > 0 else "#e74c3c" if sym_diff < 0 else "#aaa"
+        row_html += f"<td style='text-align:right; font-family:monospace; color:{diff_color}; width:{change_width}%; font-size:0.8em;'>{sym_diff:+.2f}</td>"
+    row_html += "</tr>"
+
+    # Copy Msg line
+    icon = "🟢" if upnl >= 0 else "🔴"
+    diff_msg = " ".join(f"`{label} {sym_diff:+.2f}`" for label, sym_diff in zip(labels, sym_diffs))
+    row_msg = f"`{sym:<6} | {side:<5}` {icon} `{upnl:+.2f} $`" + (f" ({diff_msg})" if diff_msg else "") + "\n"
+    return row_html, row_msg
+
+
+def _rows(report):
+    labels = tuple(report.changes)
+    change_width = 30 // max(len(labels), 1)
+    positions = report.positions
+    for sym, side, upnl, *sym_diffs in positions[['symbol', 'side', 'upnl', *labels]].itertuples(index=False):
+        yield position_row(str(sym), str(side), float(upnl), tuple(sym_diffs), labels, change_width)
+
+
+def report_message(report):
+    """The report as a Telegram-Markdown message."""
+    emoji_total = "🟢" if report.total >= 0 else "🔴"
+    copy_msg = f"*Total uPNL*: {emoji_total} `{report.total:+.2f} USD`\n"
+    for label, change in report.changes.items():
+        copy_msg += f"*{label} Change*: `{change:+.2f} USD`\n"
+    copy_msg += "--------------------------------\n"
+    return copy_msg + "".join(row_msg for _, row_msg in _rows(report))
+
+
+def report_html(report):
+    """The report as the dashboard's colored HTML card."""
+    total = report.total
+    fallback_warning = ""
+    if not report.live_positions:
+        fallback_warning = '<span style="color:#e67e22; font-size:0.8em; margin-left:10px;">(⚠️ History Data - Live API Failed)</span>'
+
+    change_lines = "".join(
+        f"""<p style="color:#aaa; margin-bottom:5px;">📉 {label} Change: <span style="color:{'#2ecc71' if change >= 0 else '#e74c3c'};">{change:+.2f} USD</span></p>"""
+        for label, change in report.changes.items()
+    )
+    change_headers = "".join(
+        f'<th style="text-align:right; color:#888; padding-bottom:5px; font-size:0.9em;">{label}</th>'
+        for label in report.changes
+    )
+
+    html_report = f"""
+    <div style="background-color:#1E1E1E; padding:15px; border-radius:10px; border:1px solid #333;">
+        <h4 style="margin-top:0; color:white;">💰 Total uPNL: <span style="color:{'#2ecc71' if total >= 0 else '#e74c3c'};">{total:+.2f} USD</span>{fallback_warning}</h4>
+        {change_lines}
+        <p style="color:#aaa; margin-bottom:5px;">💰 Day Realized: <span style="color:{'#2ecc71' if report.realized >= 0 else '#e74c3c'};">{report.realized:+.2f} USD</span></p>
+        <p style="color:#aaa; margin-bottom:15px;">📈 YTD Realized: <span style="color:{'#2ecc71' if report.ytd >= 0 else '#e74c3c'};">{report.ytd:+.2f} USD</span></p>
+        <hr style="border-top: 1px solid #444;">
+        <table style="width:100%; color:white; border-collapse: collapse;">
+            <thead>
+                <tr style="border-bottom: 1px solid #333;">
+                    <th style="text-align:left; color:#888; padding-bottom:5px; font-size:0.9em;">Symbol</th>
+                    <th style="text-align:left; color:#888; padding-bottom:5px; font-size:0.9em;">Side</th>
+                    <th style="text-align:right; color:#888; padding-bottom:5px; font-size:0.9em;">uPNL</th>
+                    {change_headers}
+                </tr>
+            </thead>
+            <tbody>
+    """
+    html_report += "".join(row_html for row_html, _ in _rows(report))
+    if report.positions.empty and report.live_positions:
+        html_report += f"<tr><td colspan='{3 + len(report.changes)}' style='color:#aaa; font-size:0.8em;'>No open positions in the selected symbols</td></tr>"
+    html_report += "</tbody></table></div>"
+    return html_report
+
+
+@dataclass(frozen=True)
+class Rules:
+    """Alert thresholds in USD (None disables a rule).
+
+    ``total_below``: total uPNL under this. ``drop``: total uPNL fell by
+    more than this over ``drop_window``. ``symbol_beyond``: one position's
+    uPNL further than this from zero, either way.
+    """
+
+    total_below: float = None
+    drop: float = None
+    drop_window: str = '15m'
+    symbol_beyond: float = None
+
+
+def evaluate_rules(report, rules):
+    """``{key: message}`` for every rule ``report`` breaks; keys stay the same while a rule keeps firing.
+
+    The symbol rule is one vectorized comparison over all positions.
+    """
+    alerts = {}
+    if rules.total_below is not None and report.total < rules.total_below:
+        alerts['total'] = f"🔴 Total uPNL {report.total:+.2f} USD is below {rules.total_below:+.2f} USD"
+    change = report.changes.get(rules.drop_window)
+    if rules.drop is not None and change is not None and change < -abs(rules.drop):
+        alerts[f'drop:{rules.drop_window}'] = (
+            f"📉 Total uPNL moved {change:+.2f} USD in {rules.drop_window} (limit -{abs(rules.drop):.2f} USD)"
+        )
+    if rules.symbol_beyond is not None and not report.positions.empty:
+        positions = report.positions
+        upnl = positions['upnl'].to_numpy(dtype='float64')
+        for i in np.flatnonzero(np.abs(upnl) > abs(rules.symbol_beyond)):
+            sym, side = str(positions['symbol'].iat[i]), str(positions['side'].iat[i])
+            alerts[f'symbol:{sym}:{side}'] = (
+                f"⚠️ {sym} {side} uPNL {upnl[i]:+.2f} USD is beyond ±{abs(rules.symbol_beyond):.2f} USD"
+            )
+    return alerts
+
+
+class ReportFeed:
+    """The report frames of one bot, fetched the way the dashboard's poller does.
+
+    History and global history are fetched as deltas into rolling buffers
+    sized to the longest change window; positions and the current year's
+    income use conditional GETs. An endpoint that fails keeps its last
+    frame; ``errors`` has the latest error per endpoint. ``symbols`` limits
+    the history and positions to those symbols (sent to the API as
+    ``symbols=A,B`` and applied again here, for APIs without the filter).
+    """
+
+    def __init__(self, base_url, key='', change_windows=None, timeout=5, raw_seconds=3600, rollup_seconds=300,
+                 symbols=None):
+        self.base_url = base_url.rstrip('/')
+        self.change_windows = change_windows
+        self.timeout = timeout
+        self.symbols = tuple(symbols) if symbols else None
+        self.params = {"symbols": ",".join(self.symbols)} if self.symbols else None
+        self.session = make_session(4, headers={"X-API-Key": key} if key else None)
+        window = max(change_windows.values()) + rollup_seconds
+        self.buffers = {
+            'history': RollingBuffer(['ts', 'symbol'], window, normalize_history, raw_seconds, rollup_seconds,
+                                     dtypes=COMPACT_DTYPES),
+            'global': RollingBuffer(['ts'], window, normalize_global, raw_seconds, rollup_seconds,
+                                    dtypes=COMPACT_DTYPES),
+        }
+        self.gets = {name: ConditionalGet().get_json for name in ENDPOINTS}
+        self.frames = {
+            'history': normalize_history(None),
+            'global': normalize_global(None),
+            'ytd': normalize_ytd(None),
+            'positions': normalize_positions(None),
+        }
+        self.errors = {}
+
+    def _fetch(self, name):
+        url = f"{self.base_url}{ENDPOINTS[name]}"
+        get, session, timeout = self.gets[name], self.session, self.timeout
+        if name in self.buffers:
+            params = self.params if name == 'history' else None
+            return fetch_incremental(url, self.buffers[name], session=session, timeout=timeout, get=get, params=params)
+        if name == 'ytd':
+            payload = fetch_ytd(url, time.localtime().tm_year, session=session, timeout=timeout, get=get)
+            return payload if payload is UNCHANGED else normalize_ytd(payload)
+        payload = get(url, session=session, params=self.params, timeout=timeout)
+        return payload if payload is UNCHANGED else normalize_positions(payload)
+
+    def _attempt(self, name):
+        try:
+            return self._fetch(name), None
+        except requests.exceptions.RequestException as e:
+            return UNCHANGED, e
+
+    def refresh(self):
+        """Fetch every endpoint in parallel; returns the current ``Report`` (None before any global history)."""
+        results = run_parallel({name: functools.partial(self._attempt, name) for name in ENDPOINTS})
+        for name, (df, error) in results.items():
+            if df is not UNCHANGED:
+                self.frames[name] = df
+            if error is None:
+                self.errors.pop(name, None)
+            else:
+                self.errors[name] = error
+        frames = self.frames
+        return compute_report(
+            frames['history'], frames['global'], frames['ytd'], frames['positions'], self.change_windows, self.symbols
+        )
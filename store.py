@@ -0,0 +1,81 @@
+"""On-disk PnL time-series store (SQLite)."""
+import sqlite3
+import threading
+from contextlib import closing
+
+import pandas as pd
+
+# kind -> (table, columns, primary key). Tables are clustered on ts first so
+# range queries are index range scans however big the store grows.
+TABLES = {
+    'global': ('global_pnl', ['ts', 'upnl'], ['ts']),
+    'history': ('symbol_pnl', ['ts', 'symbol', 'upnl'], ['ts', 'symbol']),
+    'positions': ('position_snapshots', ['ts', 'symbol', 'side', 'upnl'], ['ts', 'symbol', 'side']),
+}
+
+_TYPES = {'ts': 'INTEGER NOT NULL', 'symbol': 'TEXT NOT NULL', 'side': 'TEXT NOT NULL', 'upnl': 'REAL'}
+
+
+class PnlStore:
+    """Append-only store for global, per-symbol and position snapshots.
+
+    Safe to share between threads: each call opens its own connection and
+    writes are serialized. Rows are upserted on their primary key, so
+    re-appending overlapping fetches is harmless.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._write_lock = threading.Lock()
+        with closing(self._connect()) as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            for table, columns, key in TABLES.values():
+                cols = ', '.join(f'{c} {_TYPES[c]}' for c in columns)
+                conn.execute(
+                    f'CREATE TABLE IF NOT EXISTS {table} ({cols}, PRIMARY KEY ({", ".join(key)})) WITHOUT ROWID'
+                )
+            conn.commit()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def append(self, kind, df):
+        """Upsert the rows of ``df`` (must have the kind's columns). Returns the row count."""
+        table, columns, _ = TABLES[kind]
+        if df.empty:
+            return 0
+        rows = df[columns].astype({c: str for c in columns if c in ('symbol', 'side')})
+        rows = list(rows.itertuples(index=False, name=None))
+        placeholders = ', '.join('?' * len(columns))
+        with self._write_lock, closing(self._connect()) as conn:
+            conn.executemany(f'INSERT OR REPLACE INTO {table} ({", ".join(columns)}) VALUES ({placeholders})', rows)
+            conn.commit()
+        return len(rows)
+
+    def load(self, kind, since=None, until=None, every=None):
+        """Rows with ``since <= ts <= until`` (either bound optional), ordered by ts.
+
+        With ``every`` (seconds), only the last row per ``every``-second bucket
+        (and key) is returned: a rollup done by SQLite, for long ranges.
+        """
+        table, columns, key = TABLES[kind]
+        where, params = [], []
+        if since is not None:
+            where.append('ts >= ?')
+            params.append(int(since))
+        if until is not None:
+            where.append('ts <= ?')
+            params.append(int(until))
+        if every:
+            # SQLite takes the bare columns of a MAX() aggregate from the row holding the max
+            select = ', '.join('MAX(ts) AS ts' if c == 'ts' else c for c in columns)
+            sql = f'SELECT {select} FROM {table}'
+        else:
+            sql = f'SELECT {", ".join(columns)} FROM {table}'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        if every:
+            sql += f' GROUP BY {", ".join([f"ts / {int(every)}", *key[1:]])}'
+        sql += f' ORDER BY {", ".join(key)}'
+        with closing(self._connect()) as conn:
+            return pd.read_sql_query(sql, conn, params=params)